@@ -1,57 +1,88 @@
-import os
-import sqlite3
+from itertools import groupby
+from operator import itemgetter
 from src.scrapers.faculty_scraper import scrape_professors
-from src.scrapers.scholar_scraper import search_recent_publications
-from src.utils.email_generator import generate_and_save_email
+from src.scrapers.scholar_pool import lookup_publications
+from src.scrapers.citation_store import CitationStore
+from src.utils.email_generator import render_many
+from src.utils.pipeline_db import PIPELINE_DB_PATH
+from src.utils.storage import BatchWriter, close_connections, get_connection, iter_rows
+
+# One entry per person: cross-appointed professors share an identity_key and
+# are only looked up once. People come in order of their first appointment,
+# with all of a person's rows adjacent, so they can be grouped as they stream.
+PEOPLE_SQL = """
+    SELECT identity_key, name, department FROM professors
+    ORDER BY MIN(id) OVER (PARTITION BY identity_key), id
+"""
+
+RENDER_BATCH_SIZE = 100
+
+def iter_people(conn):
+    """Stream (identity_key, [(name, department), ...]) from the professors table"""
+    for identity_key, rows in groupby(iter_rows(conn, PEOPLE_SQL), key=itemgetter(0)):
+        yield identity_key, [(name, department) for _, name, department in rows]
+
+def render_batch(batch, writer):
+    """Render and save a batch of (name, department, paper title), then show the emails"""
+    for prof_name, _, email in render_many(batch, writer=writer):
+        print(f"\nGenerated email for {prof_name}:")
+        print("=" * 50)
+        print(email)
+        print("=" * 50)
 
 def main():
-    # Update database path to use src/databases
-    db_dir = os.path.join(os.path.dirname(__file__), 'src', 'databases')
-    os.makedirs(db_dir, exist_ok=True)
-    
-    db_path = os.path.join(db_dir, 'uoft_professors.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create tables if they don't exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS professors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            department TEXT NOT NULL,
-            UNIQUE(name, department)
-        )
-    """)
+    # One database for every stage; created (and migrated from the old
+    # per-stage files) on first use
+    db_path = PIPELINE_DB_PATH
+    conn = get_connection(db_path)
     
     # Scrape professors
     print("Scraping faculty data...")
     scrape_professors()
     
-    # Get all professors from database
-    cursor.execute("SELECT name, department FROM professors")
-    professors = cursor.fetchall()
+    # Look up publications only for professors without a stored publication
+    # list, through the rate-limited worker pool, and store them in batches
+    store = CitationStore(db_path)
+    to_fetch = [
+        appointments[0] for _, appointments in iter_people(conn)
+        if not store.has_publications(appointments[0][0])
+    ]
+    people = conn.execute("SELECT COUNT(DISTINCT identity_key) FROM professors").fetchone()[0]
+    print(f"\n{people - len(to_fetch)} professors already have stored publications, "
+          f"looking up {len(to_fetch)}")
+    departments = dict(to_fetch)
+    lookups = lookup_publications(name for name, _ in to_fetch)
+    store.ingest(
+        (prof_name, departments[prof_name], publications)
+        for prof_name, publications in lookups
+    )
     
-    # Generate emails for each professor
-    for prof_name, department in professors:
+    # Generate emails for each professor from the stored publications,
+    # rendering and saving RENDER_BATCH_SIZE at a time
+    writer = BatchWriter(conn)
+    batch = []
+    for _, appointments in iter_people(conn):
+        prof_name, department = appointments[0]
         print(f"\nProcessing {prof_name} from {department} department...")
+        if len(appointments) > 1:
+            others = ', '.join(dept for _, dept in appointments[1:])
+            print(f"Also appointed to: {others}")
         
-        # Get recent publications
-        publications = search_recent_publications(prof_name)
-        
+        publications = store.most_cited(prof_name)
         if publications:
-            recent_pub = publications[0]  # Get the most recent publication
+            recent_pub = publications[0]
             print(f"Found publication: {recent_pub['title']}")
-            
-            # Generate email
-            email = generate_and_save_email(prof_name, department, recent_pub['title'])
-            print("\nGenerated email:")
-            print("=" * 50)
-            print(email)
-            print("=" * 50)
+            batch.append((prof_name, department, recent_pub['title']))
+            if len(batch) >= RENDER_BATCH_SIZE:
+                render_batch(batch, writer)
+                batch = []
         else:
             print(f"No publications found for {prof_name}")
+    render_batch(batch, writer)
     
-    conn.close()
+    writer.flush()
+    store.close()
+    close_connections()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
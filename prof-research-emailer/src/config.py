@@ -6,5 +6,5 @@ load_dotenv()
 
 # Configuration settings for the project
 DATABASE_DIR = os.path.join(os.path.dirname(__file__), 'databases')
-DATABASE_NAME = "uoft_professors.db"
+DATABASE_NAME = "pipeline.db"
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
\ No newline at end of file
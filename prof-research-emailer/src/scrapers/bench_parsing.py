@@ -0,0 +1,74 @@
+# Benchmark full-page vs targeted parsing of the saved department listings
+#
+#   python -m src.scrapers.bench_parsing --save     # download fixtures once
+#   python -m src.scrapers.bench_parsing            # run the benchmark
+import argparse
+import time
+from pathlib import Path
+
+from src.scrapers.faculty_scraper import DEPARTMENT_CONFIGS, FAST_PARSER, parse_listing
+from src.scrapers.page_fetcher import PageFetcher
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+
+def save_fixtures():
+    """Download every department listing into FIXTURE_DIR"""
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    urls = {dept: config['url'] for dept, config in DEPARTMENT_CONFIGS.items()}
+    with PageFetcher() as fetcher:
+        for dept, response, error in fetcher.fetch_many(urls):
+            if error is not None:
+                print(f"Error fetching {dept}: {error}")
+                continue
+            path = FIXTURE_DIR / f'{dept}.html'
+            path.write_bytes(response.content)
+            print(f"Saved {dept} listing to {path} ({len(response.content)} bytes)")
+
+def time_parse(html, config, fast, parser, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        names = parse_listing(html, config, fast=fast, parser=parser)
+        best = min(best, time.perf_counter() - start)
+    return best, names
+
+def run_benchmark(repeat=5):
+    modes = [
+        ("full html.parser", False, None),
+        ("targeted html.parser", True, 'html.parser'),
+    ]
+    if FAST_PARSER != 'html.parser':
+        modes.append((f"targeted {FAST_PARSER}", True, FAST_PARSER))
+
+    totals = {label: 0.0 for label, _, _ in modes}
+    for dept, config in DEPARTMENT_CONFIGS.items():
+        path = FIXTURE_DIR / f'{dept}.html'
+        if not path.exists():
+            print(f"No fixture for {dept} - run with --save first")
+            continue
+
+        html = path.read_text(encoding='utf-8', errors='replace')
+        print(f"\n{dept} ({len(html) / 1024:.0f} KB)")
+        baseline = None
+        for label, fast, parser in modes:
+            elapsed, names = time_parse(html, config, fast, parser, repeat)
+            totals[label] += elapsed
+            if baseline is None:
+                baseline = (elapsed, names)
+            match = "ok" if names == baseline[1] else "MISMATCH"
+            print(f"  {label:<24} {elapsed * 1000:8.1f} ms  "
+                  f"{baseline[0] / elapsed:5.1f}x  {len(names)} names  {match}")
+
+    print("\nTotal (best of each):")
+    for label, elapsed in totals.items():
+        print(f"  {label:<24} {elapsed * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark department listing parsers")
+    parser.add_argument('--save', action='store_true', help="download fresh fixtures first")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.save:
+        save_fixtures()
+    run_benchmark(args.repeat)
@@ -0,0 +1,121 @@
+from src.utils.name_utils import normalize_name
+from src.utils.pipeline_db import PIPELINE_DB_PATH, connect
+
+DEFAULT_DB_PATH = PIPELINE_DB_PATH
+
+def _year(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class CitationStore:
+    """Local store of each professor's Scholar publication list.
+
+    Rows live in professor_citations next to the professors table and are
+    keyed by identity key, so email generation can pick a paper from disk
+    instead of querying Scholar again.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        # connect() creates this table along with the rest of the schema
+        self.conn = connect(db_path)
+
+    @staticmethod
+    def setup_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS professor_citations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                identity_key TEXT NOT NULL,
+                professor_name TEXT NOT NULL,
+                department TEXT NOT NULL,
+                paper_title TEXT NOT NULL,
+                citation_count INTEGER NOT NULL DEFAULT 0,
+                year INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(identity_key, paper_title)
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_citations_most_cited
+            ON professor_citations(identity_key, citation_count DESC, year DESC)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_citations_most_recent
+            ON professor_citations(identity_key, year DESC, citation_count DESC)
+        """)
+        conn.commit()
+
+    def ingest(self, records, replace=True, batch_size=500):
+        """Store publication lists from (professor_name, department, publications).
+
+        publications are dicts with 'title', 'year' and 'citations' (or
+        'num_citations'). With replace, titles no longer listed for the
+        professor are removed. Rows are committed every batch_size rows
+        instead of once per professor. Returns the number of professors stored.
+        """
+        stored = 0
+        pending = 0
+        for professor_name, department, publications in records:
+            identity_key = normalize_name(professor_name)
+            rows = [
+                (
+                    identity_key, professor_name, department, pub['title'],
+                    pub.get('citations', pub.get('num_citations')) or 0,
+                    _year(pub.get('year'))
+                )
+                for pub in publications
+            ]
+
+            if replace:
+                self.conn.execute(
+                    "DELETE FROM professor_citations WHERE identity_key = ?", (identity_key,)
+                )
+            self.conn.executemany("""
+                INSERT INTO professor_citations
+                (identity_key, professor_name, department, paper_title, citation_count, year)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(identity_key, paper_title) DO UPDATE SET
+                    citation_count = excluded.citation_count,
+                    year = excluded.year,
+                    updated_at = CURRENT_TIMESTAMP
+            """, rows)
+
+            stored += 1
+            pending += len(rows) or 1
+            if pending >= batch_size:
+                self.conn.commit()
+                pending = 0
+
+        self.conn.commit()
+        return stored
+
+    def has_publications(self, professor_name):
+        return self.conn.execute(
+            "SELECT 1 FROM professor_citations WHERE identity_key = ? LIMIT 1",
+            (normalize_name(professor_name),)
+        ).fetchone() is not None
+
+    def _query(self, professor_name, order_by, limit):
+        rows = self.conn.execute(f"""
+            SELECT paper_title, citation_count, year FROM professor_citations
+            WHERE identity_key = ?
+            ORDER BY {order_by}
+            LIMIT ?
+        """, (normalize_name(professor_name), limit)).fetchall()
+        return [
+            {'title': title, 'citations': citations, 'year': year if year is not None else 'N/A'}
+            for title, citations, year in rows
+        ]
+
+    def most_cited(self, professor_name, limit=1):
+        return self._query(professor_name, "citation_count DESC, year DESC", limit)
+
+    def most_recent(self, professor_name, limit=1):
+        return self._query(professor_name, "year DESC, citation_count DESC", limit)
+
+    def publications(self, professor_name):
+        return self._query(professor_name, "citation_count DESC, year DESC", -1)
+
+    def close(self):
+        self.conn.close()
@@ -1,13 +1,30 @@
 import requests
-from bs4 import BeautifulSoup
-import sqlite3
-import time
+from bs4 import BeautifulSoup, SoupStrainer
 import re
-import os
+from src.scrapers.page_fetcher import PageFetcher
+from src.scrapers.http_cache import HTTPCache, DEFAULT_CACHE_PATH
+from src.utils.name_utils import normalize_name
+from src.utils.pipeline_db import PIPELINE_DB_PATH, connect
+
+# lxml is optional; it is several times faster than the pure-Python parser
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+
+def has_class(name):
+    """Attribute filter matching name as one of an element's class tokens.
+
+    A plain string is compared with the whole class attribute when a
+    SoupStrainer filters, so elements carrying a second class would be dropped.
+    """
+    return re.compile(rf'(^|\s){re.escape(name)}(\s|$)')
 
 DEPARTMENT_CONFIGS = {
     "MIE": {
         "url": "https://www.mie.utoronto.ca/faculty/",
+        "parse_only": SoupStrainer('h5', attrs={'class': has_class('pp-content-grid-title')}),
         "selector": lambda soup: [
             h5.get_text(strip=True) 
             for h5 in soup.find_all('h5', class_='pp-content-grid-title')
@@ -15,6 +32,7 @@ DEPARTMENT_CONFIGS = {
     },
     "Chemical": {
         "url": "https://chem-eng.utoronto.ca/faculty-staff/faculty-members/",
+        "parse_only": SoupStrainer('h2', attrs={'class': has_class('fl-post-feed-title')}),
         "selector": lambda soup: [
             h2.a.get_text(strip=True) 
             for h2 in soup.find_all('h2', class_='fl-post-feed-title')
@@ -22,6 +40,7 @@ DEPARTMENT_CONFIGS = {
     },
     "MSE": {
         "url": "https://mse.utoronto.ca/faculty-staff/professors/",
+        "parse_only": SoupStrainer('div', attrs={'class': has_class('fl-rich-text')}),
         "selector": lambda soup: [
             link.get_text(strip=True)
             for div in soup.find_all('div', class_='fl-rich-text')
@@ -31,6 +50,7 @@ DEPARTMENT_CONFIGS = {
     },
     "BME": {
         "url": "https://bme.utoronto.ca/faculty-research/core-faculty/",
+        "parse_only": SoupStrainer('div', attrs={'class': has_class('awsm-personal-info')}),
         "selector": lambda soup: [
             h3.get_text(strip=True)
             for div in soup.find_all('div', class_='awsm-personal-info')
@@ -39,66 +59,167 @@ DEPARTMENT_CONFIGS = {
     }
 }
 
-def scrape_professors():
-    # Update database path to use src/databases
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'databases', 'uoft_professors.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Update table schema to include email
-    cursor.execute("""
+def parse_listing(html, config, fast=True, parser=None):
+    """Run a department's selector over its listing page.
+
+    In fast mode only the elements matched by the config's parse_only
+    strainer (and their children) are built, using FAST_PARSER unless a
+    parser is given. Otherwise the whole page is parsed with html.parser.
+    """
+    if fast:
+        soup = BeautifulSoup(html, parser or FAST_PARSER, parse_only=config.get('parse_only'))
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+    return config['selector'](soup)
+
+def guess_email(name):
+    """Generate email (firstname.lastname@utoronto.ca)"""
+    name_parts = name.split()
+    if len(name_parts) >= 2:
+        return f"{name_parts[0].lower()}.{name_parts[-1].lower()}@utoronto.ca"
+    return None
+
+def ensure_professor_schema(conn):
+    """Create the professors table and its identity_key index if needed.
+
+    identity_key is normalize_name(name): the same person listed under
+    several departments shares one key, so per-person work runs once.
+    """
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS professors (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             department TEXT NOT NULL,
             email TEXT,
+            identity_key TEXT,
             UNIQUE(name, department)
         )
     """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(professors)")}
+    if 'identity_key' not in columns:
+        conn.execute("ALTER TABLE professors ADD COLUMN identity_key TEXT")
+
+    # Backfill rows written before identity keys existed
+    conn.create_function('normalize_name', 1, normalize_name, deterministic=True)
+    conn.execute("""
+        UPDATE professors SET identity_key = normalize_name(name)
+        WHERE identity_key IS NULL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_professors_identity_key
+        ON professors(identity_key)
+    """)
+    conn.commit()
+
+def ingest_department(conn, dept, names):
+    """Write one department's scraped names in a single transaction.
+
+    Names already stored for the department are left untouched so their ids
+    stay stable; only new names are inserted. Professors that disappeared
+    from the listing are reported but kept, since later stages reference them.
+    Returns {'added': [...], 'removed': [...], 'unchanged': [...]}.
+    """
+    scraped = []
+    seen = set()
+    for name in names:
+        # Clean up the name
+        name = re.sub(r'\s+', ' ', name or '').strip()
+        if name and name not in seen:
+            seen.add(name)
+            scraped.append(name)
+
+    existing = {
+        name for (name,) in
+        conn.execute("SELECT name FROM professors WHERE department = ?", (dept,))
+    }
+    added = [name for name in scraped if name not in existing]
+    unchanged = [name for name in scraped if name in existing]
+    removed = sorted(existing - seen)
+
+    with conn:
+        conn.executemany("""
+            INSERT INTO professors (name, department, email, identity_key)
+            VALUES (?, ?, ?, ?)
+        """, [(name, dept, guess_email(name), normalize_name(name)) for name in added])
+
+    return {'added': added, 'removed': removed, 'unchanged': unchanged}
+
+def scrape_professors(configs=None, max_workers=8, host_delay=1.0, timeout=(5, 30),
+                      db_path=None, use_cache=True, cache_path=DEFAULT_CACHE_PATH,
+                      fast_parse=True):
+    """Scrape every department listing concurrently and store the professors.
+
+    Pages are fetched in parallel (politeness is enforced per host by
+    PageFetcher), then parsed and written on this thread as they arrive.
+    With use_cache, requests are conditional and pages that have not changed
+    since the last successful run are neither parsed nor written. The cache
+    is only trusted for departments the target database already has rows
+    for, so a new or different db_path is always filled.
+    fast_parse selects the targeted parse in parse_listing.
+
+    Returns {department: diff} for every department that was written, where
+    diff is the result of ingest_department.
+    """
+    configs = configs or DEPARTMENT_CONFIGS
+
+    conn = connect(db_path or PIPELINE_DB_PATH)
+
+    results = {}
+    print(f"\nScraping {len(configs)} departments...")
+    cache = HTTPCache(cache_path) if use_cache else None
+    # The HTTP cache is shared by every database; "unchanged" only means
+    # something for departments this one already holds
+    stored = {dept for (dept,) in conn.execute("SELECT DISTINCT department FROM professors")}
+    fetcher = PageFetcher(max_workers=max_workers, host_delay=host_delay, timeout=timeout)
+    pages = fetcher.fetch_many({
+        dept: (config['url'],
+               cache.conditional_headers(config['url']) if cache and dept in stored else None)
+        for dept, config in configs.items()
+    })
+
+    with fetcher:
+        for dept, response, error in pages:
+            config = configs[dept]
+            if error is not None:
+                print(f"Error accessing {config['url']}: {error}")
+                continue
+
+            try:
+                if cache and dept in stored and cache.is_unchanged(config['url'], response):
+                    print(f"{dept} listing unchanged since last run, skipping")
+                    cache.store(config['url'], response)
+                    continue
+
+                response.raise_for_status()
+                
+                names = parse_listing(response.text, config, fast=fast_parse)
+                
+                print(f"Found {len(names)} professors in {dept}")
+
+                diff = ingest_department(conn, dept, names)
+                results[dept] = diff
+                print(f"{dept}: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+                      f"{len(diff['unchanged'])} unchanged")
+                for name in diff['added']:
+                    print(f"  + {name}")
+                for name in diff['removed']:
+                    print(f"  - {name}")
+
+                if cache:
+                    cache.store(config['url'], response)
+                
+            except requests.RequestException as e:
+                print(f"Error accessing {config['url']}: {e}")
+            except Exception as e:
+                print(f"Error processing {dept}: {str(e)}")
+                import traceback
+                print(traceback.format_exc())
     
-    for dept, config in DEPARTMENT_CONFIGS.items():
-        print(f"\nScraping {dept} department from {config['url']}...")
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
-            }
-            response = requests.get(config['url'], headers=headers)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            names = config['selector'](soup)
-            
-            print(f"Found {len(names)} professors in {dept}")
-            
-            for name in names:
-                if name:
-                    # Clean up the name
-                    name = re.sub(r'\s+', ' ', name).strip()
-                    # Generate email (firstname.lastname@utoronto.ca)
-                    email = None
-                    name_parts = name.split()
-                    if len(name_parts) >= 2:
-                        email = f"{name_parts[0].lower()}.{name_parts[-1].lower()}@utoronto.ca"
-                    
-                    print(f"Processing: {name} ({email})")
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO professors (name, department, email) 
-                        VALUES (?, ?, ?)
-                    """, (name, dept, email))
-                    print(f"Added {name} from {dept} to database")
-            
-            conn.commit()
-            time.sleep(1)  # Be nice to the servers
-            
-        except requests.RequestException as e:
-            print(f"Error accessing {config['url']}: {e}")
-        except Exception as e:
-            print(f"Error processing {dept}: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-    
+    if cache:
+        cache.close()
     conn.close()
     print("\nFaculty scraping completed")
+    return results
 
 if __name__ == "__main__":
     scrape_professors()
\ No newline at end of file
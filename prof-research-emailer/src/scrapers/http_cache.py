@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sqlite3
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'databases', 'http_cache.db')
+
+class HTTPCache:
+    """Persistent validator cache for conditional GETs.
+
+    Stores the ETag, Last-Modified and a SHA-256 of the body for each URL so
+    callers can send If-None-Match/If-Modified-Since and tell whether a page
+    actually changed since it was last processed.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT NOT NULL,
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+
+    def _get(self, url):
+        return self.conn.execute(
+            "SELECT etag, last_modified, body_hash FROM http_cache WHERE url = ?", (url,)
+        ).fetchone()
+
+    def conditional_headers(self, url):
+        """Headers that turn a GET for url into a conditional request"""
+        row = self._get(url)
+        headers = {}
+        if row:
+            etag, last_modified, _ = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    @staticmethod
+    def body_hash(response):
+        return hashlib.sha256(response.content).hexdigest()
+
+    def is_unchanged(self, url, response):
+        """True on a 304, or when the body hashes the same as last time"""
+        if response.status_code == 304:
+            return True
+        row = self._get(url)
+        return row is not None and row[2] == self.body_hash(response)
+
+    def store(self, url, response):
+        """Remember the validators for a page that was fully processed"""
+        if response.status_code == 304:
+            self.conn.execute(
+                "UPDATE http_cache SET fetched_at = CURRENT_TIMESTAMP WHERE url = ?", (url,)
+            )
+        else:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body_hash)
+                VALUES (?, ?, ?, ?)
+            """, (
+                url,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                self.body_hash(response)
+            ))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
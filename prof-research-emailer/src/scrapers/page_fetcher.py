@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
+}
+
+class PageFetcher:
+    """Fetch many pages concurrently over one pooled keep-alive session.
+
+    Requests to different hosts run in parallel (up to max_workers), while
+    requests to the same host are spaced at least host_delay seconds apart.
+    """
+
+    def __init__(self, max_workers=8, host_delay=1.0, timeout=(5, 30), headers=None):
+        self.max_workers = max_workers
+        self.host_delay = host_delay
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_locks = {}
+        self._next_allowed = {}
+        self._locks_guard = threading.Lock()
+
+    def _wait_for_host(self, host):
+        """Block until this host may receive another request"""
+        with self._locks_guard:
+            lock = self._host_locks.setdefault(host, threading.Lock())
+
+        with lock:
+            wait = self._next_allowed.get(host, 0) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next_allowed[host] = time.monotonic() + self.host_delay
+
+    def fetch(self, url, headers=None):
+        """Fetch a single URL, respecting the per-host delay"""
+        self._wait_for_host(urlparse(url).netloc)
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def fetch_many(self, requests_by_key):
+        """Fetch {key: url} or {key: (url, headers)} concurrently.
+
+        Yields (key, response, error) tuples as each request finishes, so
+        callers can process results on their own thread in completion order.
+        Any exception from a request (not only requests' own, e.g. a URL that
+        cannot be parsed) is returned as its error rather than raised.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for key, target in requests_by_key.items():
+                url, headers = target if isinstance(target, tuple) else (target, None)
+                futures[executor.submit(self.fetch, url, headers)] = key
+
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    yield key, future.result(), None
+                except Exception as e:
+                    yield key, None, e
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
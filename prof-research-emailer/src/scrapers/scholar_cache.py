@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.utils.name_utils import normalize_name
+from src.utils.title_index import TitleIndex
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'databases', 'scholar_cache.db')
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # seconds
+
+class ScholarCache:
+    """SQLite cache of filled Google Scholar author profiles.
+
+    Profiles are keyed by normalize_name() of the professor's name, so every
+    spelling of a person shares one entry. Entries older than max_age
+    seconds are treated as missing.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS author_profiles (
+                name_key TEXT PRIMARY KEY,
+                query_name TEXT NOT NULL,
+                profile_json TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, professor_name, max_age=None):
+        """Return (profile, fetched_at), or (None, None) on a miss"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT profile_json, fetched_at FROM author_profiles WHERE name_key = ?",
+                (normalize_name(professor_name),)
+            ).fetchone()
+        if row is None or time.time() - row[1] > max_age:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, professor_name, profile, fetched_at=None):
+        """Store a profile; pass the original fetched_at to keep its age"""
+        with self._lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO author_profiles
+                (name_key, query_name, profile_json, fetched_at)
+                VALUES (?, ?, ?, ?)
+            """, (
+                normalize_name(professor_name), professor_name,
+                json.dumps(profile), fetched_at or time.time()
+            ))
+            self.conn.commit()
+
+_cache = None
+
+def get_cache():
+    """Process-wide ScholarCache shared by every Scholar caller"""
+    global _cache
+    if _cache is None:
+        _cache = ScholarCache()
+    return _cache
+
+def _to_publication(pub):
+    """Reduce a scholarly Publication to the JSON-safe fields we use"""
+    entry = {
+        'title': pub['bib']['title'],
+        'year': pub['bib'].get('pub_year', 'N/A'),
+        'num_citations': pub.get('num_citations', 0),
+        'author_pub_id': pub.get('author_pub_id')
+    }
+    if pub.get('filled'):
+        entry['abstract'] = pub['bib'].get('abstract', '')
+        entry['pub_url'] = pub.get('pub_url', '')
+    return entry
+
+class AuthorProfile:
+    """Google Scholar profile for one professor, fetched only as far as it is read.
+
+    Nothing is requested until an attribute is touched:
+    - name/affiliation/interests need only the author search,
+    - publications(limit) fills the publication listing, and only its first
+      `limit` rows (most cited first) when a limit is given,
+    - publication_detail(pub) fills a single publication (abstract, URL,
+      untruncated title) on demand.
+    Whatever is fetched is written back to the ScholarCache, so later
+    callers and later runs reuse it until the entry expires.
+    """
+
+    def __init__(self, professor_name, force_refresh=False, max_age=None,
+                 backend=None, cache=None):
+        self.professor_name = professor_name
+        self._backend = backend
+        self._cache = cache or get_cache()
+        self._title_index = None
+        self._data, self._fetched_at = (None, None) if force_refresh else \
+            self._cache.get(professor_name, max_age)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            from scholarly import scholarly
+            self._backend = scholarly
+        return self._backend
+
+    def _save(self):
+        self._cache.put(self.professor_name, self._data, self._fetched_at)
+        if self._fetched_at is None:
+            self._fetched_at = time.time()
+
+    def _basics(self):
+        if self._data is None:
+            author = next(self.backend.search_author(self.professor_name), None)
+            self._data = {
+                'name': author.get('name', self.professor_name) if author else self.professor_name,
+                'scholar_id': author.get('scholar_id') if author else None,
+                'affiliation': author.get('affiliation', '') if author else '',
+                'interests': author.get('interests', []) if author else []
+            }
+            self._save()
+        return self._data
+
+    @property
+    def found(self):
+        return self._basics()['scholar_id'] is not None
+
+    @property
+    def name(self):
+        return self._basics()['name']
+
+    @property
+    def scholar_id(self):
+        return self._basics()['scholar_id']
+
+    @property
+    def affiliation(self):
+        return self._basics()['affiliation']
+
+    @property
+    def interests(self):
+        return self._basics()['interests']
+
+    def publications(self, limit=None):
+        """Publication listing (title, year, num_citations), most cited first"""
+        data = self._basics()
+        if data['scholar_id'] is None:
+            return []
+
+        pubs = data.get('publications')
+        complete = data.get('publications_complete', True)
+        if pubs is not None and (complete or (limit and len(pubs) >= limit)):
+            return pubs[:limit] if limit else pubs
+
+        author = {
+            'container_type': 'Author',
+            'scholar_id': data['scholar_id'],
+            'filled': [],
+            'name': data['name']
+        }
+        author = self.backend.fill(author, sections=['publications'],
+                                   publication_limit=limit or 0)
+        data['publications'] = [_to_publication(pub) for pub in author.get('publications', [])]
+        data['publications_complete'] = not limit or len(data['publications']) < limit
+        self._save()
+        return data['publications']
+
+    def title_index(self):
+        """TitleIndex over the full publication list, built once per profile"""
+        if self._title_index is None:
+            self._title_index = TitleIndex(pub['title'] for pub in self.publications())
+        return self._title_index
+
+    def publication_detail(self, pub):
+        """Fill one publication from publications() with its full details"""
+        if 'abstract' in pub or not pub.get('author_pub_id'):
+            return pub
+
+        from scholarly.data_types import PublicationSource
+        filled = self.backend.fill({
+            'container_type': 'Publication',
+            'source': PublicationSource.AUTHOR_PUBLICATION_ENTRY,
+            'author_pub_id': pub['author_pub_id'],
+            'bib': {'title': pub['title'], 'pub_year': pub['year']},
+            'num_citations': pub['num_citations'],
+            'filled': False
+        })
+        filled['filled'] = True
+        pub.update(_to_publication(filled))
+        self._save()
+        return pub
+
+def get_author_profile(professor_name, force_refresh=False, max_age=None, backend=None):
+    """Return the lazily filled, cached AuthorProfile for a professor.
+
+    Only data that is missing from the cache (or everything, with
+    force_refresh) is fetched, and only when it is first read. backend
+    defaults to the scholarly module.
+    """
+    return AuthorProfile(professor_name, force_refresh=force_refresh,
+                         max_age=max_age, backend=backend)
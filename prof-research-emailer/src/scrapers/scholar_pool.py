@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.scrapers.scholar_scraper import fetch_recent_publications
+
+THROTTLE_MARKERS = ('429', 'too many requests', 'captcha', 'unusual traffic', 'cannot fetch')
+
+def is_throttled(error):
+    """True if an exception looks like Scholar rate limiting or blocking"""
+    if type(error).__name__ == 'MaxTriesExceededException':
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`.
+
+    pause() empties the bucket for a while, which makes every worker back off
+    together when one of them sees a throttling response.
+    """
+
+    def __init__(self, rate=0.5, capacity=2):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+class RateLimitedBackend:
+    """Wrap a scholarly-like backend so every network call takes a token"""
+
+    def __init__(self, backend, bucket):
+        self.backend = backend
+        self.bucket = bucket
+
+    def search_author(self, *args, **kwargs):
+        self.bucket.acquire()
+        return self.backend.search_author(*args, **kwargs)
+
+    def fill(self, *args, **kwargs):
+        self.bucket.acquire()
+        return self.backend.fill(*args, **kwargs)
+
+class ProxyRotation:
+    """Routes a scholarly-like backend through a list of proxies, moving on
+    to the next one when the current proxy gets blocked.
+
+    proxies are whatever backend.use_proxy() accepts (for scholarly,
+    configured ProxyGenerators). The last proxy is never dropped; once only
+    it is left, blocks are handled by pausing instead.
+    """
+
+    def __init__(self, backend, proxies):
+        self.backend = backend
+        self.proxies = list(proxies)
+        self._lock = threading.Lock()
+        backend.use_proxy(self.proxies[0])
+
+    @property
+    def current(self):
+        return self.proxies[0]
+
+    def block(self, proxy):
+        """Drop proxy after a throttled request through it. Returns True if
+        requests now go through another proxy, so a retry needs no pause."""
+        with self._lock:
+            if proxy != self.proxies[0]:
+                # Another worker already rotated it out
+                return True
+            if len(self.proxies) == 1:
+                return False
+            self.proxies.pop(0)
+            self.backend.use_proxy(self.proxies[0])
+            print(f"Scholar proxy blocked, switching to the next one ({len(self.proxies)} left)")
+            return True
+
+def lookup_publications(professor_names, limit=None, max_workers=3, rate=0.5, burst=2,
+                        max_retries=4, backoff=30, backend=None, proxies=None):
+    """Look up publications for many professors with a small worker pool.
+
+    All workers share one token bucket, so Scholar sees at most `rate`
+    requests per second no matter how many workers run; cache hits cost no
+    tokens. When a lookup is throttled the whole pool pauses for
+    backoff * 2**attempt seconds and the lookup is retried, up to
+    max_retries times. With proxies (see ProxyRotation), a throttled
+    lookup first moves the pool to the next proxy and retries at once.
+
+    Yields (professor_name, publications) in input order as results become
+    available; a lookup that ultimately fails yields [].
+    """
+    if backend is None:
+        from scholarly import scholarly as backend
+
+    bucket = TokenBucket(rate, burst)
+    limited = RateLimitedBackend(backend, bucket)
+    rotation = ProxyRotation(backend, proxies) if proxies else None
+
+    def lookup(professor_name):
+        for attempt in range(max_retries + 1):
+            proxy = rotation.current if rotation else None
+            try:
+                return fetch_recent_publications(professor_name, limit=limit, backend=limited)
+            except Exception as e:
+                if not is_throttled(e) or attempt == max_retries:
+                    print(f"Error retrieving publications for {professor_name}: {e}")
+                    return []
+                if rotation and rotation.block(proxy):
+                    print(f"Scholar throttled on {professor_name}; retrying through the next proxy")
+                    continue
+                delay = backoff * 2 ** attempt
+                print(f"Scholar throttled on {professor_name}; pausing {delay}s before retry")
+                bucket.pause(delay)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        names = list(professor_names)
+        yield from zip(names, executor.map(lookup, names))
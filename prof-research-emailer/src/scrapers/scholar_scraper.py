@@ -1,48 +1,55 @@
-import sqlite3
+from src.scrapers.scholar_cache import get_author_profile
+from src.scrapers.citation_store import CitationStore
 
-def search_recent_publications(professor_name):
-    from scholarly import scholarly
+def fetch_recent_publications(professor_name, limit=None, with_abstracts=False,
+                              force_refresh=False, backend=None):
+    """Publications for a professor, most cited first. Raises on lookup errors.
 
-    search_query = scholarly.search_author(professor_name)
-    try:
-        author = next(search_query)
-        author_filled = scholarly.fill(author, sections=['publications'])
-        publications = author_filled['publications']
-        recent_publications = []
+    limit fetches only the first N entries of the listing, and abstracts are
+    only requested (one extra request per publication) with_abstracts.
+    """
+    profile = get_author_profile(professor_name, force_refresh=force_refresh, backend=backend)
+    recent_publications = []
+
+    for pub in profile.publications(limit):
+        if with_abstracts:
+            pub = profile.publication_detail(pub)
+        recent_publications.append({
+            'title': pub['title'],
+            'abstract': pub.get('abstract') or 'No description available',
+            'year': pub['year'] if pub['year'] != 'N/A' else 'Year not available',
+            'citations': pub.get('num_citations', 0)
+        })
 
-        for pub in publications:
-            recent_publications.append({
-                'title': pub['bib']['title'],
-                'abstract': pub['bib'].get('abstract', 'No description available'),
-                'year': pub['bib'].get('pub_year', 'Year not available')
-            })
+    return recent_publications
 
-        return recent_publications
+def search_recent_publications(professor_name, limit=None, with_abstracts=False,
+                               force_refresh=False, backend=None):
+    """fetch_recent_publications, printing errors and returning [] instead"""
+    try:
+        return fetch_recent_publications(professor_name, limit, with_abstracts,
+                                         force_refresh, backend)
     except Exception as e:
         print(f"Error retrieving publications for {professor_name}: {e}")
         return []
 
-def search_most_cited_publication(professor_name):
-    from scholarly import scholarly
-
+def search_most_cited_publication(professor_name, force_refresh=False):
     try:
-        search_query = scholarly.search_author(professor_name)
-        author = next(search_query)
-        author_filled = scholarly.fill(author, sections=['publications'])
-        publications = author_filled['publications']
+        profile = get_author_profile(professor_name, force_refresh=force_refresh)
 
-        # Find most cited publication
+        # Find most cited publication; the listing is sorted by citations,
+        # so only its first page is needed
         most_cited = None
         max_citations = -1
 
-        for pub in publications:
+        for pub in profile.publications(limit=1):
             citations = pub.get('num_citations', 0)
             if citations > max_citations:
                 max_citations = citations
                 most_cited = {
-                    'title': pub['bib']['title'],
+                    'title': pub['title'],
                     'citations': citations,
-                    'year': pub['bib'].get('pub_year', 'N/A')
+                    'year': pub['year']
                 }
 
         return most_cited
@@ -52,27 +59,15 @@ def search_most_cited_publication(professor_name):
         return None
 
 def update_citation_database(professor_name, department, citation_data):
+    """Store a single publication, e.g. from search_most_cited_publication"""
     if not citation_data:
         return
 
-    conn = sqlite3.connect("uoft_professors.db")
-    cursor = conn.cursor()
-
+    store = CitationStore()
     try:
-        cursor.execute("""
-            INSERT OR REPLACE INTO professor_citations 
-            (professor_name, department, paper_title, citation_count, year)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            professor_name,
-            department,
-            citation_data['title'],
-            citation_data['citations'],
-            citation_data['year']
-        ))
-        conn.commit()
+        store.ingest([(professor_name, department, [citation_data])], replace=False)
         print(f"Updated citation data for {professor_name}")
     except Exception as e:
         print(f"Error updating database: {e}")
     finally:
-        conn.close()
\ No newline at end of file
+        store.close()
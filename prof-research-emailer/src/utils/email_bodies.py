@@ -0,0 +1,52 @@
+import hashlib
+import zlib
+
+# Email text is stored once in email_bodies, zlib-compressed and keyed by
+# the SHA-256 of the text; stage tables hold only the hash
+COMPRESSION_LEVEL = 9
+
+SAVE_BODY_SQL = "INSERT OR IGNORE INTO email_bodies (hash, body) VALUES (?, ?)"
+
+# Every column that references a body, for pruning
+BODY_COLUMNS = {
+    'templated_emails': ('email_hash',),
+    'gemmed_emails': ('original_hash', 'enhanced_hash'),
+    'validated_emails': ('original_hash', 'enhanced_hash', 'validated_hash'),
+    'sent_emails': ('email_hash',),
+}
+
+def body_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def compress_body(text: str) -> bytes:
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+def decompress_body(blob: bytes) -> str:
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def put_bodies(db, *texts):
+    """Store texts (if not already stored) and return their hashes.
+
+    db is a connection or a storage.BatchWriter, so bodies are committed
+    together with the stage row that references them.
+    """
+    hashes = [body_hash(text) for text in texts]
+    db.executemany(SAVE_BODY_SQL, [
+        (h, compress_body(text)) for h, text in zip(hashes, texts)
+    ])
+    return hashes
+
+def get_body(conn, hash_: str) -> str:
+    """Text stored under hash_, or None"""
+    row = conn.execute("SELECT body FROM email_bodies WHERE hash = ?", (hash_,)).fetchone()
+    return decompress_body(row[0]) if row else None
+
+def prune_bodies(conn) -> int:
+    """Delete bodies no stage row references any more; returns the count"""
+    referenced = " UNION ".join(
+        f"SELECT {column} FROM {table}"
+        for table, columns in BODY_COLUMNS.items() for column in columns
+    )
+    cursor = conn.execute(f"DELETE FROM email_bodies WHERE hash NOT IN ({referenced})")
+    conn.commit()
+    return cursor.rowcount
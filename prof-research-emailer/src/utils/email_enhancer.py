@@ -1,125 +1,162 @@
-import os
 from pathlib import Path
 from dotenv import load_dotenv
 import sqlite3
 from datetime import datetime
-from google import genai
-from google.genai import types
-import time
-import random
-from tenacity import retry, stop_after_attempt, wait_exponential
+import argparse
+import asyncio
 import json
+from src.utils.email_bodies import put_bodies
+from src.utils.email_generator import generate_email
+from src.utils.gemini_client import AsyncGeminiClient, run_streaming
+from src.utils.llm_backends import BACKENDS, make_backend
+from src.utils.llm_cache import get_response_cache
+from src.utils.input_hash import input_hash
+from src.utils.pipeline_db import (PIPELINE_DB_PATH, PROFESSOR_ID, delete_other_appointments_sql,
+                                   first_appointment_sql, not_processed_sql)
+from src.utils.storage import batched_writes, get_connection, iter_rows
+from src.utils.student_prefix import build_student_prefix
+from src.utils.template_registry import TEMPLATE_SLOTS
 
 # Load environment variables
 load_dotenv()
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Structured reply for the single-call verify+enhance mode
+VERIFY_ENHANCE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'verified': {'type': 'BOOLEAN'},
+        'publication': {'type': 'STRING'},
+        'notes': {'type': 'STRING'},
+        'email': {'type': 'STRING'}
+    },
+    'required': ['verified', 'publication', 'notes', 'email']
+}
+
+# Structured reply for fill-slots mode: verification plus one value per
+# template slot, rendered into the template locally
+SLOT_FILL_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'verified': {'type': 'BOOLEAN'},
+        'publication': {'type': 'STRING'},
+        'notes': {'type': 'STRING'},
+        **{slot: {'type': 'STRING'} for slot in TEMPLATE_SLOTS}
+    },
+    'required': ['verified', 'publication', 'notes', *TEMPLATE_SLOTS]
+}
+
+# One gemmed row per person: rows left under another department go first
+DELETE_OTHER_APPOINTMENTS_SQL = delete_other_appointments_sql('gemmed_emails')
+
+SAVE_GEMMED_SQL = f"""
+    INSERT INTO gemmed_emails 
+    (professor_id, professor_name, department, original_hash, enhanced_hash, 
+     paper_title, verification_notes, input_hash)
+    VALUES ({PROFESSOR_ID}, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(professor_name, department) DO UPDATE SET
+        original_hash = excluded.original_hash,
+        enhanced_hash = excluded.enhanced_hash,
+        paper_title = excluded.paper_title,
+        verification_notes = excluded.verification_notes,
+        input_hash = excluded.input_hash,
+        created_at = CURRENT_TIMESTAMP
+"""
+
+def _reply_text(result, field, mode):
+    """Stripped non-empty string value of a reply field, else ValueError"""
+    value = result.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{mode} reply has no usable {field!r}")
+    return value.strip()
+
+def _is_verified(result, mode):
+    """The reply's verified flag; ValueError unless it is a JSON object
+    with a boolean verified"""
+    if not isinstance(result, dict):
+        raise ValueError(f"{mode} reply is not a JSON object")
+    if not isinstance(result.get('verified'), bool):
+        raise ValueError(f"{mode} reply has no boolean 'verified'")
+    return result['verified']
+
+def single_call_values(result):
+    """Stripped publication and email from a verify+enhance reply, or None
+    if the professor was not verified. Raises ValueError for a reply missing
+    either, or with an empty or non-string value."""
+    if not _is_verified(result, "Verify+enhance"):
+        return None
+    return {field: _reply_text(result, field, "Verify+enhance")
+            for field in ('publication', 'email')}
+
+def slot_values(result):
+    """Stripped slot values from a fill-slots reply, or None if the professor
+    was not verified. Raises ValueError for a reply missing the publication
+    or any slot, or with an empty or non-string value."""
+    if not _is_verified(result, "Fill-slots"):
+        return None
+    _reply_text(result, 'publication', "Fill-slots")
+    return {slot: _reply_text(result, slot, "Fill-slots") for slot in TEMPLATE_SLOTS}
 
 class EmailEnhancer:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+    def __init__(self, use_cache: bool = True, single_call: bool = False, backend=None,
+                 db_path=PIPELINE_DB_PATH, fill_slots: bool = False):
+        self.db_path = db_path
+        # backend: an LLMBackend; defaults to Gemini, or whatever $LLM_BACKEND names
+        self.backend = backend or make_backend()
+        # single_call verifies and enhances in one structured JSON request
+        self.single_call = single_call
+        # fill_slots asks only for the template's slot values and renders
+        # the email locally, so the fixed text is never rewritten
+        self.fill_slots = fill_slots
+        # use_cache=False bypasses the persistent response cache entirely
+        self.llm = AsyncGeminiClient(
+            self.backend, cache=get_response_cache() if use_cache else None
+        )
         self.setup_database()
         self.load_student_info()
         
     def setup_database(self):
-        """Initialize the databases"""
-        db_dir = Path(__file__).parent.parent / 'databases'
-        db_dir.mkdir(exist_ok=True)
-        
-        self.template_db = db_dir / 'templated_emails.db'
-        self.enhanced_db = db_dir / 'gemmed_emails.db'
-        
-        # Setup enhanced emails database
-        conn = sqlite3.connect(self.enhanced_db)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS gemmed_emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                professor_name TEXT NOT NULL,
-                department TEXT NOT NULL,
-                original_email TEXT NOT NULL,
-                enhanced_email TEXT NOT NULL,
-                paper_title TEXT NOT NULL,
-                verification_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(professor_name, department)
-            )
-        """)
-        conn.commit()
-        conn.close()
+        """Shared pipeline connection"""
+        self.conn = get_connection(self.db_path)
+        # Set to a batched_writes() writer while a run is in progress
+        self.writer = None
 
     def load_student_info(self):
         """Load student background information"""
         config_path = Path(__file__).parent.parent / 'config' / 'student_info.json'
         with open(config_path, 'r') as f:
             self.student_info = json.load(f)
+        self.student_prefix = build_student_prefix(self.student_info)
 
     def get_templated_emails(self):
-        """Fetch all unprocessed emails from templated_emails database"""
+        """Stream templated emails that are new or changed since they were enhanced"""
         try:
-            conn = sqlite3.connect(self.template_db)
-            cursor = conn.cursor()
-            
-            # First check if templated_emails exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='templated_emails'")
-            if not cursor.fetchone():
-                print("No templated_emails table found. Please generate emails first.")
-                return []
-            
-            # Get all emails from templated_emails
-            cursor.execute("""
-                SELECT professor_name, department, email_content 
-                FROM templated_emails
+            # One templated email per person (the first one), so a
+            # cross-appointed professor is enhanced once rather than once per
+            # department, skipped when some department's gemmed row was
+            # enhanced from exactly this content
+            yield from iter_rows(self.conn, f"""
+                SELECT t.professor_name, t.department, t.email_content
+                FROM templated_emails_text t
+                JOIN professors p ON p.id = t.professor_id
+                WHERE {first_appointment_sql('templated_emails', 't')}
+                AND {not_processed_sql('gemmed_emails', 'input_hash(t.email_hash)')}
+                ORDER BY t.id
             """)
-            emails = cursor.fetchall()
-            
-            # Now check gemmed_emails for already processed ones
-            conn_gemmed = sqlite3.connect(self.enhanced_db)
-            cursor_gemmed = conn_gemmed.cursor()
-            
-            cursor_gemmed.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='gemmed_emails'")
-            if cursor_gemmed.fetchone():
-                # If gemmed_emails exists, filter out processed ones
-                cursor_gemmed.execute("SELECT professor_name FROM gemmed_emails")
-                processed_profs = {row[0] for row in cursor_gemmed.fetchall()}
-                emails = [email for email in emails if email[0] not in processed_profs]
-            
-            conn_gemmed.close()
-            return emails
             
         except sqlite3.Error as e:
             print(f"Database error: {e}")
-            return []
-        finally:
-            conn.close()
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
-    def _make_api_request(self, prompt: str, max_tokens: int = 500, temp: float = 0.1) -> str:
-        """Make API request with retry logic"""
-        try:
-            # Add random delay between requests
-            time.sleep(random.uniform(1.0, 2.0))
-            
-            response = self.client.models.generate_content(
-                model="gemini-pro",
-                contents=[prompt],
-                config=types.GenerateContentConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=temp
-                )
-            )
-            return response.text
-        except Exception as e:
-            if "RESOURCE_EXHAUSTED" in str(e):
-                print("API rate limit reached. Waiting before retry...")
-                time.sleep(60)  # Wait 60 seconds before retry
-                raise  # Let retry decorator handle it
-            raise
 
-    def verify_and_enhance(self, professor_name: str, department: str, original_email: str) -> dict:
+    async def _make_api_request(self, prompt: str, max_tokens: int = 500, temp: float = 0.1) -> str:
+        """Make API request through the shared adaptive-concurrency layer"""
+        return await self.llm.generate(prompt, max_tokens=max_tokens, temp=temp)
+
+    async def verify_and_enhance(self, professor_name: str, department: str, original_email: str) -> dict:
         """Verify professor and enhance email using Gemini"""
+        if self.fill_slots:
+            return await self.verify_and_fill_slots(professor_name, department, original_email)
+        if self.single_call:
+            return await self.verify_and_enhance_single(professor_name, department, original_email)
+
         try:
             verification_prompt = f"""
             Task 1 - Verify Professor at UofT:
@@ -131,7 +168,7 @@ class EmailEnhancer:
             NOTES: [Verification details]
             """
 
-            verify_text = self._make_api_request(verification_prompt)
+            verify_text = await self._make_api_request(verification_prompt)
             
             # Parse verification response
             is_verified = "VERIFIED: True" in verify_text
@@ -144,20 +181,11 @@ class EmailEnhancer:
                     "message": f"Verification failed: {notes}"
                 }
 
-            # Enhanced email generation with longer wait
-            time.sleep(2)  # Additional delay between requests
-            
+            # Enhanced email generation
             enhance_prompt = f"""
             Task: Enhance this research opportunity email for Professor {professor_name} at UofT.
             
-            About the student:
-            - Name: {self.student_info['name']}
-            - Program: {self.student_info['program']}
-            - Year: {self.student_info['year']}
-            - Current relevant courses: {', '.join(self.student_info['relevant_courses'])}
-            - Technical skills: {', '.join(self.student_info['technical_skills'])}
-            - Projects: {json.dumps(self.student_info['projects'], indent=2)}
-            - Research interests: {', '.join(self.student_info['research_interests'])}
+            About the student: see the student's background above.
 
             Original email:
             {original_email}
@@ -175,10 +203,11 @@ class EmailEnhancer:
             Return only the enhanced email text.
             """
 
-            enhanced_email = self._make_api_request(
+            enhanced_email = await self.llm.generate(
                 enhance_prompt, 
                 max_tokens=1000, 
-                temp=0.2
+                temp=0.2,
+                prefix=self.student_prefix
             )
 
             return {
@@ -195,53 +224,213 @@ class EmailEnhancer:
                 "message": f"Processing failed: {str(e)}"
             }
 
+    async def verify_and_enhance_single(self, professor_name: str, department: str,
+                                        original_email: str) -> dict:
+        """Verify and enhance in one request with a JSON response schema"""
+        try:
+            prompt = f"""
+            Task 1 - Verify Professor at UofT:
+            1. Check if {professor_name} is currently a professor in the {department} department at University of Toronto
+            2. Find their most relevant and recent publication from UofT-affiliated work
+            
+            Task 2 - If verified, enhance this research opportunity email for Professor {professor_name} at UofT.
+            
+            About the student: see the student's background above.
+
+            Original email:
+            {original_email}
+            
+            Instructions:
+            1. Research their current projects from UofT website
+            2. Reference the publication found in Task 1
+            3. Make connections between the student's actual background and the professor's research
+            4. Be honest about the student's level of experience (first-year undergraduate)
+            5. Show enthusiasm and willingness to learn
+            6. Maintain professional tone while being authentic
+            7. Focus on potential to contribute and learn rather than existing expertise
+            8. Only mention skills and experiences listed in the student background
+            
+            Respond with JSON: "verified" (true/false), "publication" (title of the
+            verified recent paper), "notes" (verification details) and "email" (the
+            enhanced email text, empty if not verified).
+            """
+
+            reply = await self.llm.generate(
+                prompt,
+                max_tokens=1200,
+                temp=0.2,
+                response_schema=VERIFY_ENHANCE_SCHEMA,
+                prefix=self.student_prefix
+            )
+            try:
+                result = json.loads(reply)
+                values = single_call_values(result)
+            except ValueError:
+                # Malformed replies must not be served from the cache next time
+                self.llm.forget(prompt, max_tokens=1200, temp=0.2,
+                                response_schema=VERIFY_ENHANCE_SCHEMA,
+                                prefix=self.student_prefix)
+                raise
+
+            if values is None:
+                return {
+                    "success": False,
+                    "message": f"Verification failed: {result.get('notes', '')}"
+                }
+
+            return {
+                "success": True,
+                "enhanced_email": values['email'],
+                "paper_title": values['publication'],
+                "notes": result.get('notes', '')
+            }
+            
+        except Exception as e:
+            print(f"Error processing {professor_name}: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Processing failed: {str(e)}"
+            }
+
+    async def verify_and_fill_slots(self, professor_name: str, department: str,
+                                    original_email: str) -> dict:
+        """Verify and get only the template's slot values in one JSON request,
+        then render the email from the template"""
+        slot_list = "\n".join(
+            f'            - "{slot}": {description}'
+            for slot, description in TEMPLATE_SLOTS.items()
+        )
+        try:
+            prompt = f"""
+            Task 1 - Verify Professor at UofT:
+            1. Check if {professor_name} is currently a professor in the {department} department at University of Toronto
+            2. Find their most relevant and recent publication from UofT-affiliated work
+            
+            Task 2 - If verified, fill in the <Insert ...> placeholders of this research
+            opportunity email for Professor {professor_name} at UofT. The rest of the
+            email is fixed and must not be rewritten.
+            
+            About the student: see the student's background above.
+
+            Email:
+            {original_email}
+            
+            Instructions:
+            1. Each value replaces its placeholder verbatim, so it must read naturally in that sentence
+            2. Make connections between the student's actual background and the professor's research
+            3. Be honest about the student's level of experience (first-year undergraduate)
+            4. Only mention courses, projects and interests listed in the student background
+            
+            Respond with JSON: "verified" (true/false), "publication" (title of the
+            verified recent paper), "notes" (verification details) and, if verified,
+            one value per placeholder:
+{slot_list}
+            """
+
+            reply = await self.llm.generate(
+                prompt,
+                max_tokens=400,
+                temp=0.2,
+                response_schema=SLOT_FILL_SCHEMA,
+                prefix=self.student_prefix
+            )
+            try:
+                result = json.loads(reply)
+                slots = slot_values(result)
+            except ValueError:
+                # Malformed replies must not be served from the cache next time
+                self.llm.forget(prompt, max_tokens=400, temp=0.2,
+                                response_schema=SLOT_FILL_SCHEMA,
+                                prefix=self.student_prefix)
+                raise
+
+            if slots is None:
+                return {
+                    "success": False,
+                    "message": f"Verification failed: {result.get('notes', '')}"
+                }
+
+            return {
+                "success": True,
+                "enhanced_email": generate_email(professor_name, result['publication'].strip(),
+                                                 department, slots=slots),
+                "paper_title": result['publication'].strip(),
+                "notes": result.get('notes', '')
+            }
+            
+        except Exception as e:
+            print(f"Error processing {professor_name}: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Processing failed: {str(e)}"
+            }
+
+    async def _process_email(self, prof_name, department, original_email):
+        print(f"\nProcessing email for: {prof_name}")
+        result = await self.verify_and_enhance(prof_name, department, original_email)
+        
+        if result["success"]:
+            # Save to database (committed with the current batch)
+            try:
+                original_hash, enhanced_hash = put_bodies(
+                    self.writer, original_email, result["enhanced_email"])
+                self.writer.execute(DELETE_OTHER_APPOINTMENTS_SQL,
+                                    (prof_name, department, prof_name, department))
+                self.writer.execute(SAVE_GEMMED_SQL, (
+                    prof_name, department, prof_name, department, original_hash,
+                    enhanced_hash, result["paper_title"],
+                    result["notes"], input_hash(original_hash)
+                ))
+                print(f"Enhanced email saved for: {prof_name}")
+            except Exception as e:
+                print(f"Error saving email: {str(e)}")
+        else:
+            print(f"Failed to process email for {prof_name}: {result['message']}")
+        
+        # Only the outcome is kept, so a long run does not hold every email
+        return prof_name, result["success"]
+
+    async def process_all_emails_async(self):
+        """Enhance all unprocessed emails concurrently.
+
+        Emails are streamed from the database and a bounded number are in
+        progress at once; the shared concurrency window decides how many
+        Gemini calls are actually in flight.
+        """
+        try:
+            async with batched_writes(self.conn) as self.writer:
+                return await run_streaming(
+                    self._process_email(prof_name, department, original_email)
+                    for prof_name, department, original_email in self.get_templated_emails()
+                )
+        finally:
+            await self.backend.close()
+
     def process_all_emails(self):
         """Process all unprocessed emails from template database"""
-        templated_emails = self.get_templated_emails()
-        results = []
-
-        for prof_name, department, original_email in templated_emails:
-            print(f"\nProcessing email for: {prof_name}")
-            
-            result = self.verify_and_enhance(prof_name, department, original_email)
-            
-            if result["success"]:
-                # Save to database
-                conn = sqlite3.connect(self.enhanced_db)
-                cursor = conn.cursor()
-                try:
-                    cursor.execute("""
-                        INSERT INTO gemmed_emails 
-                        (professor_name, department, original_email, enhanced_email, 
-                         paper_title, verification_notes)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        prof_name, department, original_email,
-                        result["enhanced_email"], result["paper_title"],
-                        result["notes"]
-                    ))
-                    conn.commit()
-                    print(f"Enhanced email saved for: {prof_name}")
-                except Exception as e:
-                    print(f"Error saving email: {str(e)}")
-                finally:
-                    conn.close()
-            else:
-                print(f"Failed to process email for {prof_name}: {result['message']}")
-            
-            results.append((prof_name, result))
-        
-        return results
+        return asyncio.run(self.process_all_emails_async())
 
 def main():
     """Main function to process all emails"""
-    enhancer = EmailEnhancer()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore and do not fill the LLM response cache")
+    parser.add_argument('--single-call', action='store_true',
+                        help="verify and enhance in one structured request")
+    parser.add_argument('--fill-slots', action='store_true',
+                        help="only ask for the template's placeholder values and render locally")
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help="LLM backend (default: $LLM_BACKEND or gemini)")
+    args = parser.parse_args()
+    
+    enhancer = EmailEnhancer(use_cache=not args.no_cache, single_call=args.single_call,
+                             backend=make_backend(args.backend), fill_slots=args.fill_slots)
     results = enhancer.process_all_emails()
     
     print("\nProcessing Summary:")
     print("=" * 50)
-    for prof_name, result in results:
-        status = "Success" if result["success"] else "Failed"
+    for prof_name, success in results:
+        status = "Success" if success else "Failed"
         print(f"{prof_name}: {status}")
 
 if __name__ == "__main__":
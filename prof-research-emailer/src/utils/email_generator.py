@@ -1,74 +1,81 @@
-import os
-import sqlite3
-from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
+from src.utils.email_bodies import put_bodies
+from src.utils.pipeline_db import PROFESSOR_ID
+from src.utils.storage import get_connection
+from src.utils.template_registry import get_template_registry
+
+# Upsert so a changed paper or template replaces the old email and the
+# enhancer sees the new content
+SAVE_TEMPLATED_SQL = f"""
+    INSERT INTO templated_emails 
+    (professor_id, professor_name, department, email_hash)
+    VALUES ({PROFESSOR_ID}, ?, ?, ?)
+    ON CONFLICT(professor_name, department) DO UPDATE SET
+        email_hash = excluded.email_hash
+    WHERE email_hash != excluded.email_hash
+"""
+
+DEFAULT_STUDENT = {'name': "Kevin Peng", 'program': "Engineering Science"}
 
 def setup_email_database():
-    """Create database directory and database if they don't exist"""
-    # Update database path to use src/databases
-    db_dir = os.path.join(os.path.dirname(__file__), '..', 'databases')
-    os.makedirs(db_dir, exist_ok=True)
-    
-    # Connect to database
-    db_path = os.path.join(db_dir, 'templated_emails.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create simplified table for storing emails
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS templated_emails (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            professor_name TEXT NOT NULL,
-            department TEXT NOT NULL,
-            email_content TEXT NOT NULL,
-            UNIQUE(professor_name, department)
-        )
-    """)
-    conn.commit()
-    return conn
+    """Shared connection to the pipeline database, which holds templated_emails"""
+    return get_connection()
+
+def generate_and_save_email(professor_name, department, paper_title, writer=None):
+    """Generate email and save to database.
+
+    With a storage.BatchWriter the row is committed with its batch;
+    otherwise it is committed right away.
+    """
+    (_, _, email_content), = render_many([(professor_name, department, paper_title)], writer=writer)
+    return email_content
+
+def render_many(professors, student=DEFAULT_STUDENT, writer=None):
+    """Render and save emails for many (professor_name, department, paper_title).
+
+    Bodies and rows are saved with one executemany each, through writer
+    if given (committed with its batch) or committed right away.
+    Returns [(professor_name, department, email_content)].
+    """
+    emails = [
+        (professor_name, department,
+         generate_email(professor_name, paper_title, department, student))
+        for professor_name, department, paper_title in professors
+    ]
+    if not emails:
+        return emails
 
-def generate_and_save_email(professor_name, department, paper_title):
-    """Generate email and save to database"""
-    # Generate email content
-    email_content = generate_email(professor_name, paper_title)
-    
-    # Save to database
-    conn = setup_email_database()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("""
-            INSERT INTO templated_emails 
-            (professor_name, department, email_content)
-            VALUES (?, ?, ?)
-        """, (professor_name, department, email_content))
-        conn.commit()
-        print(f"Email saved for Professor {professor_name}")
+        db = writer if writer is not None else setup_email_database()
+        hashes = put_bodies(db, *(content for _, _, content in emails))
+        db.executemany(SAVE_TEMPLATED_SQL, [
+            (professor_name, department, professor_name, department, email_hash)
+            for (professor_name, department, _), email_hash in zip(emails, hashes)
+        ])
+        if writer is None:
+            db.commit()
+        for professor_name, _, _ in emails:
+            print(f"Email saved for Professor {professor_name}")
     except Exception as e:
-        print(f"Error saving email: {e}")
-    finally:
-        conn.close()
+        print(f"Error saving emails: {e}")
     
-    return email_content
+    return emails
 
-def generate_email(professor_name, paper_title):
+def generate_email(professor_name, paper_title, department=None, student=DEFAULT_STUDENT,
+                   slots=None):
     """
-    Generate an email using a template and professor-specific information
+    Generate an email from the template registered for the department
+    and student, with professor-specific information. slots fills the
+    template's <Insert ...> placeholders (see TEMPLATE_SLOTS).
     """
-    # Setup Jinja2 template environment
-    template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates')
-    env = Environment(loader=FileSystemLoader(template_dir))
-    template = env.get_template('email_template.j2')
-    
     # Extract first name if possible
     last_name = professor_name.split()[-1]
     
     # Render template with professor info
-    email_content = template.render(
+    return get_template_registry().render(
+        department, student['name'],
         name=last_name,
         paper_title=paper_title,
-        student_name="Kevin Peng",
-        student_program="Engineering Science"
+        student_name=student['name'],
+        student_program=student['program'],
+        **(slots or {})
     )
-    
-    return email_content
\ No newline at end of file
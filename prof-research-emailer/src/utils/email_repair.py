@@ -0,0 +1,87 @@
+import re
+
+from src.utils.title_index import TitleIndex
+
+STUDENT_EMAIL = "kev.peng@mail.utoronto.ca"
+REQUIRED_CLOSING = "Please let me know if you have any opportunities in your lab"
+CLOSING_SENTENCE = f"{REQUIRED_CLOSING}. I can be reached at {STUDENT_EMAIL}"
+
+# Minimum TitleIndex score for a quoted span to be taken as a reformatted
+# copy of the verified title
+TITLE_REPAIR_THRESHOLD = 0.85
+
+SIGN_OFF = re.compile(
+    r'^\s*(warm regards|best regards|kind regards|regards|sincerely|best|thank you|thanks)[ \t,.!]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+QUOTED = re.compile(r'["“”«*_]+([^"“”«»*_\n]{8,}?)["“”»*_]+')
+FIRST_YEAR_VARIANTS = re.compile(r'\bfirst[\s‐-―]+year\b', re.IGNORECASE)
+
+def failed_checks(email_text: str, paper_title: str) -> list:
+    """Names of the validator rules the email breaks, in check order"""
+    failures = []
+    if not paper_title or paper_title not in email_text:
+        failures.append('title')
+    if "first-year" not in email_text.lower():
+        failures.append('first_year')
+    if STUDENT_EMAIL not in email_text:
+        failures.append('email')
+    if REQUIRED_CLOSING not in email_text:
+        failures.append('closing')
+    return failures
+
+def _insert_before_sign_off(email_text: str, paragraph: str) -> str:
+    sign_offs = list(SIGN_OFF.finditer(email_text))
+    if not sign_offs:
+        return email_text.rstrip() + "\n\n" + paragraph
+    start = sign_offs[-1].start()
+    return email_text[:start].rstrip() + "\n\n" + paragraph + "\n\n" + email_text[start:].lstrip()
+
+def _repair_title(email_text: str, paper_title: str):
+    """Swap a quoted near-copy of the title for the exact one, or return None"""
+    spans = list(QUOTED.finditer(email_text))
+    if not paper_title or not spans:
+        return None
+    match = TitleIndex([m.group(1) for m in spans]).best_match(paper_title)
+    if match is None or match[2] < TITLE_REPAIR_THRESHOLD:
+        return None
+    span = spans[match[0]]
+    return email_text[:span.start()] + f'"{paper_title}"' + email_text[span.end():]
+
+def _repair_first_year(email_text: str):
+    """Only fixes spelling ("first year", "First–year"); a missing mention stays broken"""
+    if not FIRST_YEAR_VARIANTS.search(email_text):
+        return None
+    return FIRST_YEAR_VARIANTS.sub('first-year', email_text)
+
+def repair_email(email_text: str, paper_title: str):
+    """Patch what can be patched deterministically.
+
+    Returns (email_text, failures) where failures are the rules still
+    broken afterwards; only those need another model call.
+    """
+    failures = failed_checks(email_text, paper_title)
+
+    if 'title' in failures:
+        repaired = _repair_title(email_text, paper_title)
+        if repaired is not None:
+            email_text = repaired
+
+    if 'first_year' in failures:
+        repaired = _repair_first_year(email_text)
+        if repaired is not None:
+            email_text = repaired
+
+    if 'closing' in failures:
+        # The required closing sentence carries the address as well
+        email_text = _insert_before_sign_off(email_text, CLOSING_SENTENCE)
+    elif 'email' in failures:
+        closing_at = email_text.find(REQUIRED_CLOSING) + len(REQUIRED_CLOSING)
+        sentence_end = re.compile(r'[.!?]').search(email_text, closing_at)
+        end = sentence_end.end() if sentence_end else closing_at
+        if not sentence_end:
+            email_text = email_text[:end] + "."
+            end += 1
+        email_text = email_text[:end] + f" I can be reached at {STUDENT_EMAIL}" + email_text[end:]
+
+    return email_text, failed_checks(email_text, paper_title)
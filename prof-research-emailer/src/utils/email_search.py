@@ -0,0 +1,162 @@
+import argparse
+import sqlite3
+
+# Full-text indexes over the validated and sent emails and the Scholar
+# publication lists. Each is an external-content FTS5 table reading from
+# its source (through the *_text views for email bodies), so text is not
+# stored twice; triggers keep the index in step with every write.
+SEARCH_TABLES = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS validated_search USING fts5(
+        professor_name, department, paper_title, validated_email, paper_verification,
+        content='validated_emails_text', content_rowid='id',
+        tokenize='porter unicode61'
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS sent_search USING fts5(
+        professor_name, email_content,
+        content='sent_emails_text', content_rowid='id',
+        tokenize='porter unicode61'
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS paper_search USING fts5(
+        professor_name, department, paper_title,
+        content='professor_citations', content_rowid='id',
+        tokenize='porter unicode61'
+    );
+"""
+
+VALIDATED_BODY = "decompress_body((SELECT body FROM email_bodies WHERE hash = {row}.validated_hash))"
+SENT_BODY = "decompress_body((SELECT body FROM email_bodies WHERE hash = {row}.email_hash))"
+
+def _sync_triggers(source, index, columns, values):
+    """Insert/delete/update triggers mirroring source rows into index.
+
+    values renders the indexed values for a row alias ('new' or 'old');
+    an external-content index needs the old values to remove a row.
+    """
+    cols = ", ".join(columns)
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {source} BEGIN
+        INSERT INTO {index} (rowid, {cols}) VALUES (new.id, {values('new')});
+    END;
+    CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {source} BEGIN
+        INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', old.id, {values('old')});
+    END;
+    CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE ON {source} BEGIN
+        INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', old.id, {values('old')});
+        INSERT INTO {index} (rowid, {cols}) VALUES (new.id, {values('new')});
+    END;
+    """
+
+SEARCH_TRIGGERS = (
+    _sync_triggers(
+        'validated_emails', 'validated_search',
+        ('professor_name', 'department', 'paper_title', 'validated_email', 'paper_verification'),
+        lambda row: (f"{row}.professor_name, {row}.department, {row}.paper_title, "
+                     f"{VALIDATED_BODY.format(row=row)}, {row}.paper_verification")
+    )
+    + _sync_triggers(
+        'sent_emails', 'sent_search',
+        ('professor_name', 'email_content'),
+        lambda row: f"{row}.professor_name, {SENT_BODY.format(row=row)}"
+    )
+    + _sync_triggers(
+        'professor_citations', 'paper_search',
+        ('professor_name', 'department', 'paper_title'),
+        lambda row: f"{row}.professor_name, {row}.department, {row}.paper_title"
+    )
+)
+
+# What each search scope returns; snippet() columns index into the FTS table
+SCOPES = {
+    'validated': """
+        SELECT v.professor_name, v.department, v.paper_title,
+               snippet(validated_search, -1, '[', ']', '...', 12)
+        FROM validated_search
+        JOIN validated_emails v ON v.id = validated_search.rowid
+        WHERE validated_search MATCH ?
+        ORDER BY rank LIMIT ?
+    """,
+    'sent': """
+        SELECT s.professor_name, s.professor_email, s.sent_date,
+               snippet(sent_search, -1, '[', ']', '...', 12)
+        FROM sent_search
+        JOIN sent_emails s ON s.id = sent_search.rowid
+        WHERE sent_search MATCH ?
+        ORDER BY rank LIMIT ?
+    """,
+    'papers': """
+        SELECT c.professor_name, c.department, c.paper_title, c.citation_count
+        FROM paper_search
+        JOIN professor_citations c ON c.id = paper_search.rowid
+        WHERE paper_search MATCH ?
+        ORDER BY rank LIMIT ?
+    """,
+}
+
+SCOPE_FIELDS = {
+    'validated': ('professor_name', 'department', 'paper_title', 'snippet'),
+    'sent': ('professor_name', 'professor_email', 'sent_date', 'snippet'),
+    'papers': ('professor_name', 'department', 'paper_title', 'citations'),
+}
+
+def ensure_search_schema(conn):
+    """Create the search indexes and triggers, indexing existing rows once"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_search'"
+    )}
+    conn.executescript(SEARCH_TABLES)
+    conn.executescript(SEARCH_TRIGGERS)
+    for index in ('validated_search', 'sent_search', 'paper_search'):
+        if index not in existing:
+            conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+    conn.commit()
+
+def quote_terms(text):
+    """FTS5 query matching every whitespace-separated term of text literally,
+    so input like MAT-188 is not read as query syntax"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search(conn, query, scope='validated', limit=20, plain=False):
+    """Rows of the given scope matching an FTS5 query, best match first.
+
+    query uses FTS5 syntax: words, "exact phrases", prefix*, AND/OR/NOT,
+    or column:word (e.g. paper_title:microfluidic). With plain, query is
+    taken as literal terms instead (see quote_terms). Invalid syntax
+    raises sqlite3.OperationalError.
+    """
+    if plain:
+        query = quote_terms(query)
+    rows = conn.execute(SCOPES[scope], (query, limit)).fetchall()
+    return [dict(zip(SCOPE_FIELDS[scope], row)) for row in rows]
+
+def main():
+    # Imported here: pipeline_db imports this module to build the schema
+    from src.utils.pipeline_db import PIPELINE_DB_PATH, connect
+
+    parser = argparse.ArgumentParser(description="Full-text search over emails and publications")
+    parser.add_argument('query', help='FTS5 query, e.g. microfluidic* or "MAT188"')
+    parser.add_argument('--scope', choices=sorted(SCOPES), default='validated',
+                        help="validated emails (default), sent emails or Scholar papers")
+    parser.add_argument('--plain', action='store_true',
+                        help="match the words literally instead of as FTS5 syntax")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--db', default=PIPELINE_DB_PATH, help="pipeline database path")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        results = search(conn, args.query, args.scope, args.limit, plain=args.plain)
+    except sqlite3.OperationalError as e:
+        print(f"Invalid query {args.query!r}: {e}")
+        print("Use --plain to search for the words literally")
+        return
+    finally:
+        conn.close()
+
+    for result in results:
+        print(" | ".join(str(result[field]) for field in SCOPE_FIELDS[args.scope]))
+    print(f"{len(results)} matches")
+
+if __name__ == "__main__":
+    main()
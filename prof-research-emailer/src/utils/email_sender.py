@@ -3,36 +3,40 @@ import sqlite3
 from pathlib import Path
 import win32com.client
 import time
-from typing import List, Dict
+from typing import Dict, Iterator
+from src.utils.email_bodies import put_bodies
+from src.utils.pipeline_db import PIPELINE_DB_PATH, first_appointment_sql
+from src.utils.storage import get_connection, iter_rows
+
+# One validated email per person (identity key), with the first address
+# stored for any of their appointments, for people who have not been sent
+# an email yet (by name when the sent row's professor has been deleted)
+PENDING_EMAILS_SQL = f"""
+    SELECT v.professor_id, v.professor_name, v.validated_email, v.paper_title,
+           (SELECT pe.email FROM professors pe
+            WHERE pe.identity_key = p.identity_key AND pe.email IS NOT NULL
+            ORDER BY pe.id LIMIT 1) AS email
+    FROM validated_emails_text v
+    JOIN professors p ON p.id = v.professor_id
+    WHERE {first_appointment_sql('validated_emails', 'v')}
+    AND NOT EXISTS (
+        SELECT 1 FROM sent_emails s
+        LEFT JOIN professors ps ON ps.id = s.professor_id
+        WHERE COALESCE(ps.identity_key, normalize_name(s.professor_name)) = p.identity_key
+    )
+    ORDER BY v.id
+"""
 
 class EmailSender:
-    def __init__(self):
+    def __init__(self, db_path=PIPELINE_DB_PATH):
+        self.db_path = db_path
         self.setup_database()
         self.setup_outlook()
         self.check_databases()
         
     def setup_database(self):
-        """Initialize database connection"""
-        db_dir = Path(__file__).parent.parent / 'databases'
-        self.validated_db = db_dir / 'validated_emails.db'
-        self.sent_db = db_dir / 'sent_emails.db'
-        
-        # Setup sent emails tracking
-        conn = sqlite3.connect(self.sent_db)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sent_emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                professor_name TEXT NOT NULL,
-                professor_email TEXT NOT NULL,
-                email_content TEXT NOT NULL,
-                sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT,
-                UNIQUE(professor_name)
-            )
-        """)
-        conn.commit()
-        conn.close()
+        """Shared pipeline connection (validated and sent emails live there)"""
+        self.conn = get_connection(self.db_path)
     
     def setup_outlook(self):
         """Setup connection to Outlook client"""
@@ -46,31 +50,17 @@ class EmailSender:
             raise ValueError("Could not connect to Outlook. Is it installed and running?")
     
     def check_databases(self):
-        """Check the existence and content of required databases"""
-        # Check validated_emails.db
-        if not self.validated_db.exists():
-            raise FileNotFoundError(f"validated_emails.db not found at {self.validated_db}")
-        
-        # Check professors.db for email addresses
-        # Update path to use parent directory structure
-        self.prof_db = Path(__file__).parent.parent / 'databases' / 'uoft_professors.db'
-        if not self.prof_db.exists():
-            raise FileNotFoundError(f"professors database not found at {self.prof_db}")
-        
+        """Check that the pipeline database has emails and addresses to send"""
         try:
+            cursor = self.conn.cursor()
+            
             # Check validated emails
-            conn = sqlite3.connect(self.validated_db)
-            cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM validated_emails")
             validated_count = cursor.fetchone()[0]
-            conn.close()
             
             # Check professor emails
-            conn = sqlite3.connect(self.prof_db)
-            cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM professors WHERE email IS NOT NULL")
             prof_count = cursor.fetchone()[0]
-            conn.close()
             
             print("\nDatabase Status:")
             print(f"- Found {validated_count} validated emails ready to send")
@@ -84,59 +74,31 @@ class EmailSender:
         except sqlite3.Error as e:
             raise sqlite3.Error(f"Database error: {e}")
     
-    def get_pending_emails(self) -> List[Dict]:
-        """Get all validated emails that haven't been sent"""
-        try:
-            # First check if validated_emails table exists
-            conn = sqlite3.connect(self.validated_db)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='validated_emails'
-            """)
-            
-            if not cursor.fetchone():
-                print("Error: validated_emails table not found")
-                return []
+    def count_pending_emails(self) -> int:
+        """Number of unsent validated emails that have an address to send to"""
+        return self.conn.execute(
+            f"SELECT COUNT(*) FROM ({PENDING_EMAILS_SQL}) WHERE email IS NOT NULL"
+        ).fetchone()[0]
 
-            # Get all validated emails (without checking sent_emails table first)
-            cursor.execute("""
-                SELECT v.professor_name, v.validated_email, v.paper_title
-                FROM validated_emails v
-            """)
-            
-            validated_emails = cursor.fetchall()
-            
-            # Now check professor emails
-            conn_prof = sqlite3.connect(self.prof_db)
-            cursor_prof = conn_prof.cursor()
-            cursor_prof.execute("SELECT name, email FROM professors")
-            prof_emails = {name: email for name, email in cursor_prof.fetchall() if email}
-            
-            # Create list of emails that have professor email addresses
-            emails = []
-            for prof_name, content, paper_title in validated_emails:
-                if prof_name in prof_emails:
-                    emails.append({
+    def get_pending_emails(self) -> Iterator[Dict]:
+        """Stream the validated emails that haven't been sent"""
+        try:
+            for professor_id, prof_name, content, paper_title, email in iter_rows(
+                    self.conn, PENDING_EMAILS_SQL):
+                # Only emails that have a professor email address
+                if email:
+                    yield {
+                        'professor_id': professor_id,
                         'professor_name': prof_name,
-                        'email': prof_emails[prof_name],
+                        'email': email,
                         'content': content,
                         'paper_title': paper_title
-                    })
+                    }
                 else:
                     print(f"Skipping {prof_name} - no email address found")
-            
-            return emails
                 
         except sqlite3.Error as e:
             print(f"Database error: {e}")
-            return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
-            if 'conn_prof' in locals():
-                conn_prof.close()
     
     def create_outlook_email(self, email_data: Dict) -> bool:
         """Create and display email in Outlook with retry logic"""
@@ -191,17 +153,17 @@ class EmailSender:
 
     def review_and_send_emails(self):
         """Review and send emails with user confirmation"""
-        pending_emails = self.get_pending_emails()
+        pending_count = self.count_pending_emails()
         
-        if not pending_emails:
+        if not pending_count:
             print("No pending emails to send.")
             return
         
-        print(f"\nFound {len(pending_emails)} emails to send.")
+        print(f"\nFound {pending_count} emails to send.")
         print("\nMake sure Outlook is running before continuing.")
         input("Press Enter when ready to start...")
         
-        for email in pending_emails:
+        for email in self.get_pending_emails():
             print(f"\nPreparing email for Professor {email['professor_name']}...")
             
             if self.create_outlook_email(email):
@@ -240,22 +202,21 @@ class EmailSender:
     
     def record_sent_email(self, email_data: Dict):
         """Record sent email in database"""
-        conn = sqlite3.connect(self.sent_db)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        # Committed immediately: each send is confirmed by the user and
+        # must not be lost if the session is interrupted
+        email_hash, = put_bodies(self.conn, email_data['content'])
+        self.conn.execute("""
             INSERT INTO sent_emails 
-            (professor_name, professor_email, email_content, status)
-            VALUES (?, ?, ?, ?)
+            (professor_id, professor_name, professor_email, email_hash, status)
+            VALUES (?, ?, ?, ?, ?)
         """, (
+            email_data['professor_id'],
             email_data['professor_name'],
             email_data['email'],
-            email_data['content'],
+            email_hash,
             'sent'
         ))
-        
-        conn.commit()
-        conn.close()
+        self.conn.commit()
 
 def main():
     try:
@@ -1,123 +1,39 @@
-import os
 from pathlib import Path
 from dotenv import load_dotenv
-import sqlite3
 from datetime import datetime
-from google import genai
-from google.genai import types
-from scholarly import scholarly
-import time
-import random
-from tenacity import retry, stop_after_attempt, wait_exponential
+from src.scrapers.scholar_cache import get_author_profile
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+import argparse
+import asyncio
 import json
+from src.utils.email_bodies import put_bodies
+from src.utils.email_repair import failed_checks, repair_email
+from src.utils.gemini_client import AsyncGeminiClient, run_streaming
+from src.utils.llm_backends import BACKENDS, make_backend
+from src.utils.llm_cache import get_response_cache
+from src.utils.input_hash import input_hash
+from src.utils.name_utils import normalize_name
+from src.utils.pipeline_db import (PIPELINE_DB_PATH, PROFESSOR_ID, delete_other_appointments_sql,
+                                   first_appointment_sql, not_processed_sql)
+from src.utils.storage import batched_writes, get_connection, iter_rows
+from src.utils.student_prefix import build_student_prefix
+from src.utils.title_index import normalize_title
 
 # Load environment variables
 load_dotenv()
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
-class EmailValidator:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.setup_database()
-        self.load_student_info()
-        
-    def setup_database(self):
-        """Initialize the databases"""
-        db_dir = Path(__file__).parent.parent / 'databases'
-        self.enhanced_db = db_dir / 'gemmed_emails.db'
-        self.validated_db = db_dir / 'validated_emails.db'
-        
-        # Setup validated emails database
-        conn = sqlite3.connect(self.validated_db)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS validated_emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                professor_name TEXT NOT NULL,
-                department TEXT NOT NULL,
-                original_email TEXT NOT NULL,
-                enhanced_email TEXT NOT NULL,
-                validated_email TEXT NOT NULL,
-                paper_title TEXT NOT NULL,
-                paper_verification TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(professor_name, department)
-            )
-        """)
-        conn.commit()
-        conn.close()
-
-    def load_student_info(self):
-        """Load student background information"""
-        config_path = Path(__file__).parent.parent / 'config' / 'student_info.json'
-        with open(config_path, 'r') as f:
-            self.student_info = json.load(f)
+# Minimum TitleIndex score for a paper title to count as the same publication
+TITLE_MATCH_THRESHOLD = 0.75
 
-    def verify_publication(self, professor_name: str, paper_title: str) -> dict:
-        """Verify publication using Google Scholar"""
-        try:
-            search_query = scholarly.search_author(professor_name)
-            author = next(search_query)
-            author_filled = scholarly.fill(author, sections=['publications'])
-            
-            # Check if paper exists in professor's publications
-            for pub in author_filled['publications']:
-                if paper_title.lower() in pub['bib']['title'].lower():
-                    return {
-                        "verified": True,
-                        "paper": pub['bib']['title'],
-                        "year": pub['bib'].get('pub_year', 'N/A'),
-                        "url": pub.get('pub_url', '')
-                    }
-            
-            # If paper not found, get most recent relevant publication
-            recent_pub = author_filled['publications'][0]['bib']
-            return {
-                "verified": False,
-                "suggested_paper": recent_pub['title'],
-                "year": recent_pub.get('pub_year', 'N/A'),
-                "url": recent_pub.get('pub_url', '')
-            }
-            
-        except Exception as e:
-            print(f"Error verifying publication: {e}")
-            return {"verified": False, "error": str(e)}
-
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def validate_and_improve_email(self, professor_name: str, department: str, 
-                                 original_email: str, enhanced_email: str, 
-                                 paper_title: str) -> dict:
-        """Validate and improve the enhanced email"""
-        # Verify publication first
-        pub_info = self.verify_publication(professor_name, paper_title)
-        
-        validation_prompt = f"""
-        Task: Write a research opportunity email that is STRICTLY based on the student's actual background.
-
-        Professor Information:
-        Name: {professor_name}
-        Department: {department}
-        Verified Paper: {pub_info.get('paper') or pub_info.get('suggested_paper')}
-        Year: {pub_info.get('year', 'N/A')}
-
-        Student's EXACT Background:
-        1. Program: {self.student_info['program']}
-        2. Year: {self.student_info['year']}
-        3. Actual Courses (only these):
-        {', '.join(self.student_info['relevant_courses'])}
-        4. Verified Technical Skills (only these):
-        {', '.join(self.student_info['technical_skills'])}
-        5. Real Projects:
-        {json.dumps(self.student_info['projects'], indent=2)}
-        6. Actual Awards:
-        {json.dumps(self.student_info['awards'], indent=2)}
-        
-        Rough draft 1:{original_email}
-        
-        Rought draft 2:{enhanced_email}
+# Scholar lookups run in worker threads alongside the Gemini calls; keep
+# only a couple in flight so Scholar does not start throttling
+SCHOLAR_CONCURRENCY = 2
 
+# Fixed part of the validation prompt; it goes into the cached prefix
+# after the student background, ahead of the per-professor request
+VALIDATION_RULES = """
         STRICT REQUIREMENTS:
-        1. ONLY mention the verified paper title: "{pub_info.get('paper') or pub_info.get('suggested_paper')}"
+        1. ONLY mention the verified paper title given in the request
         2. DO NOT invent or assume any skills/experience not listed above
         3. BE HONEST about being a first-year student
         4. MAINTAIN a humble, learning-focused tone
@@ -154,93 +70,255 @@ class EmailValidator:
         Format: Return ONLY the email text, no other text or explanations.
         """
 
+# One validated row per person, as in gemmed_emails
+DELETE_OTHER_APPOINTMENTS_SQL = delete_other_appointments_sql('validated_emails')
+
+# An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips
+# the triggers that keep validated_search in sync
+SAVE_VALIDATED_SQL = f"""
+    INSERT INTO validated_emails 
+    (professor_id, professor_name, department, original_hash, 
+     enhanced_hash, validated_hash, paper_title, 
+     paper_verification, input_hash)
+    VALUES ({PROFESSOR_ID}, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(professor_name, department) DO UPDATE SET
+        original_hash = excluded.original_hash,
+        enhanced_hash = excluded.enhanced_hash,
+        validated_hash = excluded.validated_hash,
+        paper_title = excluded.paper_title,
+        paper_verification = excluded.paper_verification,
+        input_hash = excluded.input_hash,
+        created_at = CURRENT_TIMESTAMP
+"""
+
+class EmailValidator:
+    def __init__(self, use_cache: bool = True, backend=None, scholar_backend=None,
+                 db_path=PIPELINE_DB_PATH):
+        self.db_path = db_path
+        # backend: an LLMBackend; defaults to Gemini, or whatever $LLM_BACKEND names
+        self.backend = backend or make_backend()
+        # scholar_backend replaces the scholarly module for publication lookups
+        self.scholar_backend = scholar_backend
+        # use_cache=False bypasses the persistent response cache entirely
+        self.llm = AsyncGeminiClient(
+            self.backend, cache=get_response_cache() if use_cache else None
+        )
+        self._scholar_slots = None
+        # (identity key, normalized title) -> publication check, per run
+        self._publication_memo = {}
+        self.setup_database()
+        self.load_student_info()
+        
+    def setup_database(self):
+        """Shared pipeline connection"""
+        self.conn = get_connection(self.db_path)
+        # Set to a batched_writes() writer while a run is in progress
+        self.writer = None
+
+    def load_student_info(self):
+        """Load student background information"""
+        config_path = Path(__file__).parent.parent / 'config' / 'student_info.json'
+        with open(config_path, 'r') as f:
+            self.student_info = json.load(f)
+        self.student_prefix = build_student_prefix(self.student_info, VALIDATION_RULES)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), reraise=True)
+    def _lookup_publication(self, professor_name: str, paper_title: str,
+                            force_refresh: bool = False) -> dict:
+        """Scholar lookup behind verify_publication; retried on its own"""
+        profile = get_author_profile(professor_name, force_refresh=force_refresh,
+                                     backend=self.scholar_backend)
+        
+        # Find the closest title in the professor's publications; small
+        # differences in punctuation, casing or truncation still match
+        publications = profile.publications()
+        if not publications:
+            return {"verified": False, "error": "No Scholar publications found"}
+        match = profile.title_index().best_match(paper_title)
+        if match and match[2] >= TITLE_MATCH_THRESHOLD:
+            pub = publications[match[0]]
+            return {
+                "verified": True,
+                "paper": pub['title'],
+                "year": pub['year'],
+                "url": pub.get('pub_url', ''),
+                "confidence": round(match[2], 3)
+            }
+        
+        # If paper not found, get most recent relevant publication
+        recent_pub = publications[0]
+        return {
+            "verified": False,
+            "suggested_paper": recent_pub['title'],
+            "year": recent_pub['year'],
+            "url": recent_pub.get('pub_url', ''),
+            "confidence": round(match[2], 3) if match else 0.0
+        }
+
+    def verify_publication(self, professor_name: str, paper_title: str,
+                           force_refresh: bool = False) -> dict:
+        """Verify publication using the cached Google Scholar profile"""
         try:
-            time.sleep(random.uniform(1.0, 2.0))
-            
-            response = self.client.models.generate_content(
-                model="gemini-pro",
-                contents=[validation_prompt],
-                config=types.GenerateContentConfig(
-                    max_output_tokens=1000,
-                    temperature=0.1  # Keep temperature low for consistency
-                )
-            )
+            return self._lookup_publication(professor_name, paper_title, force_refresh)
+        except Exception as e:
+            print(f"Error verifying publication: {e}")
+            return {"verified": False, "error": str(e)}
+
+    async def _publication_info(self, professor_name: str, paper_title: str) -> dict:
+        """verify_publication off the event loop, at most once per person and title"""
+        key = (normalize_name(professor_name), normalize_title(paper_title))
+        task = self._publication_memo.get(key)
+        if task is None:
+            if self._scholar_slots is None:
+                self._scholar_slots = asyncio.Semaphore(SCHOLAR_CONCURRENCY)
             
-            # Verify the generated email
-            if not self._verify_email_content(response.text, 
-                pub_info.get('paper') or pub_info.get('suggested_paper')):
-                raise ValueError("Generated email failed verification checks")
+            async def lookup():
+                async with self._scholar_slots:
+                    return await asyncio.to_thread(self.verify_publication, professor_name, paper_title)
             
+            task = self._publication_memo[key] = asyncio.ensure_future(lookup())
+        return await task
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           retry=retry_if_exception_type(ValueError), reraise=True)
+    async def _generate_email(self, professor_name: str, validation_prompt: str,
+                              verified_title: str) -> str:
+        """Generate and check the email; only failed checks are retried here
+        (API errors already get retried by the LLM client)"""
+        validated_email = await self.llm.generate(
+            validation_prompt,
+            max_tokens=1000,
+            temp=0.1,  # Keep temperature low for consistency
+            prefix=self.student_prefix
+        )
+        
+        # Verify the generated email and patch locally what can be patched
+        # (closing sentence, address, a reformatted title)
+        if failed_checks(validated_email, verified_title):
+            validated_email, failures = repair_email(validated_email, verified_title)
+            if failures:
+                # Only unrepairable replies go back to the model; a failing
+                # reply must not be served from the cache next time
+                self.llm.forget(validation_prompt, max_tokens=1000, temp=0.1,
+                                prefix=self.student_prefix)
+                raise ValueError(f"Generated email failed checks: {', '.join(failures)}")
+            print(f"Repaired email locally for: {professor_name}")
+        return validated_email
+
+    async def validate_and_improve_email(self, professor_name: str, department: str, 
+                                       original_email: str, enhanced_email: str, 
+                                       paper_title: str) -> dict:
+        """Validate and improve the enhanced email"""
+        # Verify publication first; retries of the email below reuse it
+        pub_info = await self._publication_info(professor_name, paper_title)
+        
+        verified_title = pub_info.get('paper') or pub_info.get('suggested_paper')
+        if not verified_title:
+            # The title check could never pass, so don't spend calls on it
+            print(f"No verified paper for {professor_name}, skipping")
             return {
-                "success": True,
-                "validated_email": response.text,
-                "paper_info": pub_info
+                "success": False,
+                "error": pub_info.get("error", "no verified paper")
             }
-            
+        validation_prompt = f"""
+        Task: Write a research opportunity email that is STRICTLY based on the student's actual background
+        and follows every rule above.
+
+        Professor Information:
+        Name: {professor_name}
+        Department: {department}
+        Verified Paper: {verified_title}
+        Year: {pub_info.get('year', 'N/A')}
+        
+        Rough draft 1:{original_email}
+        
+        Rought draft 2:{enhanced_email}
+
+        ONLY mention the verified paper title: "{verified_title}"
+        """
+
+        try:
+            validated_email = await self._generate_email(
+                professor_name, validation_prompt, verified_title
+            )
         except Exception as e:
             print(f"Error validating email: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
+        
+        return {
+            "success": True,
+            "validated_email": validated_email,
+            "paper_info": pub_info
+        }
 
     def _verify_email_content(self, email_text: str, paper_title: str) -> bool:
         """Verify the generated email follows all rules"""
-        checks = [
-            paper_title in email_text,  # Correct paper title
-            "first-year" in email_text.lower(),  # Mentions first-year status
-            "kev.peng@mail.utoronto.ca" in email_text,  # Contains email
-            "Please let me know if you have any opportunities in your lab" in email_text  # Contains required closing
-        ]
-        return all(checks)
+        return not failed_checks(email_text, paper_title)
+
+    async def _validate_row(self, prof_name, dept, orig, enhanced, paper):
+        print(f"\nValidating email for: {prof_name}")
+        
+        result = await self.validate_and_improve_email(
+            prof_name, dept, orig, enhanced, paper
+        )
+        
+        if result["success"]:
+            # Save validated email (committed with the current batch)
+            hashes = put_bodies(self.writer, orig, enhanced, result["validated_email"])
+            self.writer.execute(DELETE_OTHER_APPOINTMENTS_SQL, (prof_name, dept, prof_name, dept))
+            self.writer.execute(SAVE_VALIDATED_SQL, (
+                prof_name, dept, prof_name, dept, *hashes,
+                result["paper_info"].get('paper') or 
+                result["paper_info"].get('suggested_paper'),
+                json.dumps(result["paper_info"]),
+                input_hash(*hashes[:2])
+            ))
+            print(f"Validated email saved for: {prof_name}")
+
+    async def process_enhanced_emails_async(self):
+        """Validate new or changed enhanced emails concurrently under the shared window"""
+        # Memoized lookups and the Scholar semaphore belong to this run's loop
+        self._publication_memo = {}
+        self._scholar_slots = None
+        # Validate each person once, even if cross-appointed (first gemmed
+        # row per identity key), skipping rows already validated from
+        # exactly this enhanced email
+        rows = iter_rows(self.conn, f"""
+            SELECT g.professor_name, g.department, g.original_email, 
+                   g.enhanced_email, g.paper_title
+            FROM gemmed_emails_text g
+            JOIN professors p ON p.id = g.professor_id
+            WHERE {first_appointment_sql('gemmed_emails', 'g')}
+            AND {not_processed_sql('validated_emails', 'input_hash(g.original_hash, g.enhanced_hash)')}
+            ORDER BY g.id
+        """)
+        
+        try:
+            async with batched_writes(self.conn) as self.writer:
+                validated = await run_streaming(self._validate_row(*row) for row in rows)
+            print(f"{len(validated)} enhanced emails were new or changed since last validation")
+        finally:
+            await self.backend.close()
 
     def process_enhanced_emails(self):
         """Process all enhanced emails"""
         try:
-            conn = sqlite3.connect(self.enhanced_db)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT professor_name, department, original_email, 
-                       enhanced_email, paper_title
-                FROM gemmed_emails
-            """)
-            enhanced_emails = cursor.fetchall()
-            conn.close()
-            
-            for email in enhanced_emails:
-                prof_name, dept, orig, enhanced, paper = email
-                print(f"\nValidating email for: {prof_name}")
-                
-                result = self.validate_and_improve_email(
-                    prof_name, dept, orig, enhanced, paper
-                )
-                
-                if result["success"]:
-                    # Save validated email
-                    conn = sqlite3.connect(self.validated_db)
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO validated_emails 
-                        (professor_name, department, original_email, 
-                         enhanced_email, validated_email, paper_title, 
-                         paper_verification)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        prof_name, dept, orig, enhanced,
-                        result["validated_email"],
-                        result["paper_info"].get('paper') or 
-                        result["paper_info"].get('suggested_paper'),
-                        json.dumps(result["paper_info"])
-                    ))
-                    conn.commit()
-                    conn.close()
-                    print(f"Validated email saved for: {prof_name}")
-                    
+            asyncio.run(self.process_enhanced_emails_async())
         except Exception as e:
             print(f"Error processing emails: {e}")
 
 def main():
-    validator = EmailValidator()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore and do not fill the LLM response cache")
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help="LLM backend (default: $LLM_BACKEND or gemini)")
+    args = parser.parse_args()
+    
+    validator = EmailValidator(use_cache=not args.no_cache, backend=make_backend(args.backend))
     validator.process_enhanced_emails()
 
 if __name__ == "__main__":
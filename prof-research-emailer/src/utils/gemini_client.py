@@ -0,0 +1,178 @@
+import asyncio
+import random
+
+from src.utils.llm_backends import PermanentError
+from src.utils.llm_cache import cache_key
+
+DEFAULT_MODEL = "gemini-pro"
+
+# Rows in progress at once when streaming a stage: twice the largest
+# concurrency window, so the window never waits on the next row being read
+MAX_PENDING = 32
+
+def is_rate_limited(error) -> bool:
+    """True for Gemini quota errors: the exception's status code is 429 or
+    its status RESOURCE_EXHAUSTED, as on google-genai's APIError"""
+    return (getattr(error, 'code', None) == 429
+            or getattr(error, 'status', None) == 'RESOURCE_EXHAUSTED')
+
+class AdaptiveConcurrency:
+    """AIMD concurrency window for API calls.
+
+    Each success grows the window by 1/window (about one slot per window's
+    worth of successes); a rate-limit error halves it. Every cut starts a
+    new epoch, and 429s from requests sent before the cut are ignored, so one
+    burst of concurrent failures only halves the window once. Throughput
+    therefore settles just under the real quota instead of behind a fixed
+    sleep.
+    """
+
+    def __init__(self, initial=2.0, minimum=1.0, maximum=16.0, decrease=0.5):
+        self.window = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.epoch = 0
+        self._cond = None
+        self._loop = None
+
+    def _condition(self):
+        # asyncio primitives belong to one event loop; each asyncio.run()
+        # gets a fresh one while the learned window carries over
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self.in_flight = 0
+        return self._cond
+
+    async def __aenter__(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < max(1, int(self.window)))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self.window = min(self.maximum, self.window + 1 / self.window)
+
+    def on_throttle(self, epoch):
+        """Cut the window for a 429 on a request sent during `epoch`"""
+        if epoch != self.epoch:
+            return
+        self.epoch += 1
+        self.window = max(self.minimum, self.window * self.decrease)
+        print(f"Rate limited, concurrency window now {self.window:.1f}")
+
+_shared_limiter = None
+
+def get_shared_limiter() -> AdaptiveConcurrency:
+    """One window per process, so every Gemini caller shares the quota"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveConcurrency()
+    return _shared_limiter
+
+async def run_streaming(coros, max_pending=MAX_PENDING):
+    """Run coroutines from a lazy iterable, at most max_pending at a time.
+
+    The next coroutine is only taken from coros (typically a generator over
+    a streaming cursor) when one finishes, so rows are read as capacity
+    frees up instead of all up front. Returns results in completion order.
+    """
+    pending = set()
+    results = []
+    for coro in coros:
+        pending.add(asyncio.ensure_future(coro))
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results.extend(task.result() for task in done)
+    if pending:
+        done, _ = await asyncio.wait(pending)
+        results.extend(task.result() for task in done)
+    return results
+
+class AsyncGeminiClient:
+    """asyncio request layer shared by the enhancer and validator.
+
+    Requests go to an LLMBackend (the Gemini API, or a fake / replay backend
+    for offline runs; see llm_backends). Calls run under the shared AdaptiveConcurrency window. Rate-limit errors
+    shrink the window and are retried after a short jittered backoff; other
+    errors are retried up to max_attempts with exponential waits, except
+    PermanentErrors, which are raised at once.
+
+    With a response cache, a request whose (model, prompt, temperature,
+    max_tokens) was answered before is served from disk without a call.
+
+    prefix is the static head of a prompt (see student_prefix). The backend
+    sends it as cached context so only the per-professor prompt travels
+    with each request.
+    """
+
+    def __init__(self, backend, model=DEFAULT_MODEL, limiter=None, cache=None,
+                 max_attempts=3, max_throttle_retries=8):
+        self.backend = backend
+        self.model = model
+        self.limiter = limiter or get_shared_limiter()
+        self.cache = cache
+        self.max_attempts = max_attempts
+        self.max_throttle_retries = max_throttle_retries
+
+    def forget(self, prompt: str, max_tokens: int = 500, temp: float = 0.1,
+               response_schema: dict = None, prefix: str = None):
+        """Drop a cached response, e.g. one that failed later checks"""
+        if self.cache is not None:
+            self.cache.discard(
+                cache_key(self.model, prompt, temp, max_tokens, response_schema, prefix)
+            )
+
+    async def generate(self, prompt: str, max_tokens: int = 500, temp: float = 0.1,
+                       bypass_cache: bool = False, response_schema: dict = None,
+                       prefix: str = None) -> str:
+        """Return the reply text; with response_schema the reply is JSON text"""
+        key = cache_key(self.model, prompt, temp, max_tokens, response_schema, prefix)
+        if self.cache is not None and not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        text = await self._request(prompt, max_tokens, temp, response_schema, prefix)
+        if self.cache is not None:
+            self.cache.put(key, self.model, text)
+        return text
+
+    async def _request(self, prompt: str, max_tokens: int, temp: float,
+                       response_schema: dict = None, prefix: str = None) -> str:
+        attempts = 0
+        throttles = 0
+        while True:
+            epoch = self.limiter.epoch
+            try:
+                async with self.limiter:
+                    epoch = self.limiter.epoch
+                    text = await self.backend.generate(
+                        self.model, prompt, max_tokens, temp, response_schema, prefix
+                    )
+                self.limiter.on_success()
+                return text
+            except PermanentError:
+                raise
+            except Exception as e:
+                if is_rate_limited(e):
+                    self.limiter.on_throttle(epoch)
+                    throttles += 1
+                    if throttles > self.max_throttle_retries:
+                        raise
+                    delay = min(30, 2 ** throttles)
+                else:
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        raise
+                    delay = min(10, 4 * 2 ** (attempts - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
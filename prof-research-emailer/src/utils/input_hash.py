@@ -0,0 +1,7 @@
+import hashlib
+import json
+
+def input_hash(*parts) -> str:
+    """Hash of the upstream values a pipeline stage consumed for one row"""
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,339 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+from src.utils.llm_cache import cache_key, prefix_hash
+
+DEFAULT_RECORDING_PATH = Path(__file__).parent.parent / 'databases' / 'llm_recordings.jsonl'
+
+# How long a provider-side prefix cache lives. Longer runs recreate it;
+# it is replaced this many seconds early so no request races the expiry.
+PREFIX_CACHE_TTL_SECONDS = 3600
+PREFIX_CACHE_MARGIN_SECONDS = 60
+
+class PermanentError(Exception):
+    """A request that fails the same way however often it is retried, so
+    AsyncGeminiClient raises it at once"""
+
+class MissingRecordingError(PermanentError):
+    """ReplayBackend was asked for a request that was never recorded"""
+
+class LLMBackend(ABC):
+    """Where AsyncGeminiClient sends its requests.
+
+    Subclasses implement generate() and return the reply text. prefix, when
+    given, is a static prompt head sent before prompt. Quota errors should
+    have code 429 or status RESOURCE_EXHAUSTED (as google-genai's APIError
+    does) so the concurrency layer can recognise them; errors that retrying cannot fix should be PermanentErrors.
+    """
+
+    @abstractmethod
+    async def generate(self, model: str, prompt: str, max_tokens: int, temp: float,
+                       response_schema: dict = None, prefix: str = None) -> str:
+        """Reply text for one request"""
+
+    async def close(self):
+        """Release anything held on the provider's side; called when a stage finishes"""
+
+class GeminiBackend(LLMBackend):
+    """The real Gemini API through google-genai.
+
+    A prompt prefix is uploaded once per (model, prefix) with context
+    caching and later requests reference it by name. Where the model or
+    account does not support caching (or the prefix is below the minimum
+    cacheable size) it is sent as the system instruction instead. Caches
+    are recreated before they expire and deleted by close().
+    """
+
+    def __init__(self, api_key=None):
+        from google import genai
+        self.client = genai.Client(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        # (model, prefix hash) -> (cache name or None, monotonic expiry)
+        self._prefix_caches = {}
+        self._pending_caches = {}
+
+    async def _create_prefix_cache(self, model, prefix):
+        from google.genai import types
+        try:
+            cache = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=prefix,
+                    display_name=f"student-prefix-{prefix_hash(prefix)[:12]}",
+                    ttl=f"{PREFIX_CACHE_TTL_SECONDS}s"
+                )
+            )
+            expires = time.monotonic() + PREFIX_CACHE_TTL_SECONDS - PREFIX_CACHE_MARGIN_SECONDS
+            return cache.name, expires
+        except Exception as e:
+            print(f"Context caching unavailable, sending prefix inline: {e}")
+            # Not retried for the rest of the run
+            return None, float('inf')
+
+    async def _prefix_cache(self, model, prefix):
+        """Name of the live provider cache holding prefix, or None"""
+        key = (model, prefix_hash(prefix))
+        entry = self._prefix_caches.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        # Concurrent requests share one creation call
+        task = self._pending_caches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._create_prefix_cache(model, prefix))
+            self._pending_caches[key] = task
+        name, expires = await task
+        self._prefix_caches[key] = (name, expires)
+        self._pending_caches.pop(key, None)
+        return name
+
+    def _drop_prefix_cache(self, model, prefix, name):
+        key = (model, prefix_hash(prefix))
+        if self._prefix_caches.get(key, (None,))[0] == name:
+            del self._prefix_caches[key]
+
+    async def close(self):
+        """Delete the prefix caches this backend created instead of letting
+        them sit (and bill) until their TTL runs out"""
+        caches, self._prefix_caches = self._prefix_caches, {}
+        for name, _ in caches.values():
+            if name:
+                try:
+                    await self.client.aio.caches.delete(name=name)
+                except Exception as e:
+                    print(f"Could not delete prefix cache {name}: {e}")
+
+    async def generate(self, model, prompt, max_tokens, temp, response_schema=None, prefix=None):
+        from google.genai import types
+        config = types.GenerateContentConfig(
+            max_output_tokens=max_tokens,
+            temperature=temp
+        )
+        if response_schema is not None:
+            config.response_mime_type = 'application/json'
+            config.response_schema = response_schema
+        cached = None
+        if prefix is not None:
+            cached = await self._prefix_cache(model, prefix)
+            if cached:
+                config.cached_content = cached
+            else:
+                config.system_instruction = prefix
+
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=[prompt],
+                config=config
+            )
+        except Exception as e:
+            if not cached or getattr(e, 'status', None) != 'NOT_FOUND':
+                raise
+            # The cache expired or was deleted on the server: forget it (the
+            # next request creates a new one) and send this one inline
+            print(f"Prefix cache {cached} is gone, sending prefix inline")
+            self._drop_prefix_cache(model, prefix, cached)
+            config.cached_content = None
+            config.system_instruction = prefix
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=[prompt],
+                config=config
+            )
+        return response.text
+
+class FakeAPIError(Exception):
+    """Carries code and status like google-genai's APIError"""
+    code = None
+    status = None
+
+    def __init__(self):
+        super().__init__(f"{self.code} {self.status} (injected by FakeBackend)")
+
+class FakeRateLimitError(FakeAPIError):
+    code = 429
+    status = 'RESOURCE_EXHAUSTED'
+
+class FakeServerError(FakeAPIError):
+    code = 503
+    status = 'UNAVAILABLE'
+
+FAKE_EMAIL = """Dear Professor,
+
+My name is Kevin Peng, a first-year Engineering Science student at the University of Toronto.
+
+I read your paper "{title}" and would be glad to learn more about this research.
+
+In my courses I have worked with Python and data structures, and I am eager to keep learning.
+
+Please let me know if you have any opportunities in your lab. I can be reached at kev.peng@mail.utoronto.ca
+
+Warm regards,
+Kevin Peng"""
+
+TITLE_PATTERNS = [
+    r'verified paper title: "([^"]+)"',
+    r'recent work: "([^"]+)"',
+    r'Verified Paper: (.+)',
+]
+
+def canned_response(prompt: str, response_schema: dict = None) -> str:
+    """Deterministic reply shaped like what each pipeline prompt expects"""
+    title = 'Fake Publication'
+    for pattern in TITLE_PATTERNS:
+        match = re.search(pattern, prompt)
+        if match:
+            title = match.group(1).strip()
+            break
+    email = FAKE_EMAIL.format(title=title)
+
+    if response_schema is not None:
+        reply = {}
+        for field, spec in response_schema.get('properties', {}).items():
+            if spec.get('type') == 'BOOLEAN':
+                reply[field] = True
+            elif field == 'email':
+                reply[field] = email
+            elif field == 'publication':
+                reply[field] = title
+            else:
+                reply[field] = f"fake {field}"
+        return json.dumps(reply)
+
+    if 'VERIFIED:' in prompt:
+        return f"VERIFIED: True\nPUBLICATION: {title}\nNOTES: Verified by FakeBackend"
+    return email
+
+def uniform_latency(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal_latency(median, sigma=0.5):
+    """Long-tailed latency like a real API: most calls near median, a few slow"""
+    import math
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+class FakeBackend(LLMBackend):
+    """Offline stand-in for Gemini, for measuring throughput and retry behaviour.
+
+    latency is a function of a random.Random returning seconds (see
+    uniform_latency / lognormal_latency). error_rate and throttle_rate inject
+    server errors and 429s; quota additionally returns 429 whenever more than
+    that many calls are in flight. Replies come from responder(prompt,
+    response_schema), canned_response by default. Everything is seeded, so a
+    run is reproducible.
+    """
+
+    def __init__(self, latency=None, error_rate=0.0, throttle_rate=0.0, quota=None,
+                 responder=canned_response, seed=0):
+        self.latency = latency or uniform_latency(0.2, 0.8)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.quota = quota
+        self.responder = responder
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        # prompt_chars counts only what travels per request (not the prefix)
+        self.stats = {'calls': 0, 'throttled': 0, 'errors': 0, 'peak_in_flight': 0,
+                      'prompt_chars': 0}
+
+    async def generate(self, model, prompt, max_tokens, temp, response_schema=None, prefix=None):
+        self.stats['calls'] += 1
+        self.stats['prompt_chars'] += len(prompt)
+        if (self.quota is not None and self.in_flight >= self.quota) \
+                or self.rng.random() < self.throttle_rate:
+            self.stats['throttled'] += 1
+            raise FakeRateLimitError()
+
+        self.in_flight += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        try:
+            await asyncio.sleep(self.latency(self.rng))
+            if self.rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                raise FakeServerError()
+            return self.responder(prompt, response_schema)
+        finally:
+            self.in_flight -= 1
+
+class RecordingBackend(LLMBackend):
+    """Pass requests to another backend and append every exchange to a JSONL file"""
+
+    def __init__(self, inner, path=DEFAULT_RECORDING_PATH):
+        self.inner = inner
+        self.path = Path(path)
+
+    async def close(self):
+        await self.inner.close()
+
+    async def generate(self, model, prompt, max_tokens, temp, response_schema=None, prefix=None):
+        text = await self.inner.generate(model, prompt, max_tokens, temp, response_schema, prefix)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'key': cache_key(model, prompt, temp, max_tokens, response_schema, prefix),
+                'model': model,
+                'prefix_hash': prefix_hash(prefix) if prefix is not None else None,
+                'prompt': prompt,
+                'max_tokens': max_tokens,
+                'temperature': temp,
+                'response_schema': response_schema,
+                'response': text
+            }) + '\n')
+        return text
+
+class ReplayBackend(LLMBackend):
+    """Answer from a RecordingBackend file without any network access.
+
+    Requests that were never recorded raise MissingRecordingError unless a fallback
+    backend is given. latency optionally simulates API timing.
+    """
+
+    def __init__(self, path=DEFAULT_RECORDING_PATH, fallback=None, latency=None, seed=0):
+        self.fallback = fallback
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.responses = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.responses[record['key']] = record['response']
+
+    async def close(self):
+        if self.fallback is not None:
+            await self.fallback.close()
+
+    async def generate(self, model, prompt, max_tokens, temp, response_schema=None, prefix=None):
+        key = cache_key(model, prompt, temp, max_tokens, response_schema, prefix)
+        if key not in self.responses:
+            if self.fallback is None:
+                raise MissingRecordingError(f"No recorded response for request {key[:12]}")
+            return await self.fallback.generate(
+                model, prompt, max_tokens, temp, response_schema, prefix
+            )
+        if self.latency:
+            await asyncio.sleep(self.latency(self.rng))
+        return self.responses[key]
+
+BACKENDS = ('gemini', 'fake', 'record', 'replay')
+
+def make_backend(name=None) -> LLMBackend:
+    """Build a backend by name, defaulting to $LLM_BACKEND or 'gemini'.
+
+    'record' wraps Gemini and writes to $LLM_RECORDING_PATH (or the default
+    path under databases/); 'replay' reads the same file back.
+    """
+    name = name or os.getenv('LLM_BACKEND', 'gemini')
+    path = os.getenv('LLM_RECORDING_PATH', DEFAULT_RECORDING_PATH)
+    if name == 'gemini':
+        return GeminiBackend()
+    if name == 'fake':
+        return FakeBackend()
+    if name == 'record':
+        return RecordingBackend(GeminiBackend(), path)
+    if name == 'replay':
+        return ReplayBackend(path)
+    raise ValueError(f"Unknown LLM backend {name!r}, expected one of {BACKENDS}")
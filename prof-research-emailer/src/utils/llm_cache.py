@@ -0,0 +1,110 @@
+import atexit
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / 'databases' / 'llm_cache.db'
+DEFAULT_MAX_ENTRIES = 5000
+# Cache hits whose last_used update is held back and written in one commit
+TOUCH_BATCH_SIZE = 100
+
+def prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+
+def cache_key(model: str, prompt: str, temperature: float, max_output_tokens: int,
+              response_schema: dict = None, prefix: str = None) -> str:
+    """Content address of a request: everything that determines the reply"""
+    parts = [model, prompt, temperature, max_output_tokens]
+    if response_schema is not None:
+        parts.append(response_schema)
+    if prefix is not None:
+        # The static prompt prefix counts by its hash, so editing the
+        # student background invalidates every reply built on it
+        parts.append({'prefix': prefix_hash(prefix)})
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMResponseCache:
+    """Persistent content-addressed cache of LLM responses.
+
+    Entries are keyed by cache_key(). Once more than max_entries are stored
+    the least recently used ones are evicted. A hit only records its time in
+    memory; last_used is written for a batch of hits at once, before any
+    eviction and on flush(), so reads do not commit one by one.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._touched = {}
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used
+            ON llm_responses(last_used)
+        """)
+        self.conn.commit()
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT response FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH_SIZE:
+            self.flush()
+        return row[0]
+
+    def _write_touches(self):
+        self.conn.executemany(
+            "UPDATE llm_responses SET last_used = ? WHERE key = ?",
+            [(used, key) for key, used in self._touched.items()]
+        )
+        self._touched = {}
+
+    def flush(self):
+        """Write the buffered last_used times of recent hits"""
+        if self._touched:
+            self._write_touches()
+            self.conn.commit()
+
+    def put(self, key, model, response):
+        now = time.time()
+        # Evict by up-to-date recency
+        self._write_touches()
+        self.conn.execute("""
+            INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, model, response, now, now))
+        self.conn.execute("""
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM llm_responses ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self.conn.commit()
+
+    def discard(self, key):
+        self._touched.pop(key, None)
+        self.conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+        self.conn.commit()
+
+_cache = None
+
+def get_response_cache() -> LLMResponseCache:
+    """Process-wide response cache shared by the enhancer and validator"""
+    global _cache
+    if _cache is None:
+        _cache = LLMResponseCache()
+        atexit.register(_cache.flush)
+    return _cache
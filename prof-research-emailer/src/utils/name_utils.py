@@ -0,0 +1,44 @@
+import re
+import unicodedata
+
+TITLE_PREFIXES = {'prof', 'professor', 'dr', 'doctor', 'mr', 'mrs', 'ms'}
+POST_NOMINALS = {
+    'phd', 'p', 'eng', 'peng', 'md', 'msc', 'mba', 'frsc', 'fcae', 'fcic',
+    'jr', 'sr', 'ii', 'iii'
+}
+
+def _tokens(text: str) -> list:
+    # Strip accents, case and punctuation
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace("'", '').replace('’', '')
+    return re.sub(r'[^\w]+', ' ', text).split()
+
+def normalize_name(name: str) -> str:
+    """Identity key for a professor's name.
+
+    Two spellings of the same person map to the same key: case, accents,
+    punctuation and extra whitespace are ignored, "Prof."/"Dr." prefixes,
+    post-nominals, nicknames in parentheses and middle initials are dropped,
+    and "Last, First" listings are reordered.
+    For example "Dr. José A. Núñez, P.Eng." and "Núñez, José" -> "jose nunez".
+    """
+    if not name:
+        return ''
+
+    name = re.sub(r'\(.*?\)', ' ', name)
+    surname, *rest = name.split(',')
+    tokens = _tokens(surname)
+    for part in rest:
+        part_tokens = _tokens(part)
+        if part_tokens and not set(part_tokens) <= POST_NOMINALS:
+            tokens = part_tokens + tokens
+
+    while tokens and tokens[0] in TITLE_PREFIXES:
+        tokens = tokens[1:]
+
+    # Drop middle initials but keep a leading one ("J. Smith")
+    if len(tokens) > 2:
+        tokens = [tokens[0]] + [t for t in tokens[1:-1] if len(t) > 1] + [tokens[-1]]
+
+    return ' '.join(tokens)
@@ -0,0 +1,334 @@
+import argparse
+import sqlite3
+from pathlib import Path
+
+from src.utils.email_bodies import body_hash, compress_body, decompress_body, prune_bodies
+from src.utils.input_hash import input_hash
+from src.utils.name_utils import normalize_name
+
+DB_DIR = Path(__file__).parent.parent / 'databases'
+PIPELINE_DB_PATH = DB_DIR / 'pipeline.db'
+
+# The per-stage files the pipeline used before everything moved into one database
+LEGACY_DATABASES = {
+    'professors': 'uoft_professors.db',
+    'templated': 'templated_emails.db',
+    'gemmed': 'gemmed_emails.db',
+    'validated': 'validated_emails.db',
+    'sent': 'sent_emails.db',
+}
+
+# Resolves a stage row's professor_id from its (professor_name, department)
+PROFESSOR_ID = "(SELECT id FROM professors WHERE name = ? AND department = ?)"
+
+# A person listed under several departments shares one identity_key (see
+# ensure_professor_schema). Each stage keeps one row per person: the rules
+# below are the only place that decides which.
+
+def first_appointment_sql(table, alias, person='p'):
+    """Condition keeping row alias of table only if it is the person's
+    first row there (lowest id over all their appointments); person is
+    the alias of the professors row joined on alias.professor_id"""
+    return f"""{alias}.id = (
+        SELECT MIN(earliest.id) FROM {table} earliest
+        JOIN professors pf ON pf.id = earliest.professor_id
+        WHERE pf.identity_key = {person}.identity_key
+    )"""
+
+def not_processed_sql(target, input_hash_sql, person='p'):
+    """Condition true unless the person already has a target row made from
+    the input whose input_hash() is input_hash_sql"""
+    return f"""NOT EXISTS (
+        SELECT 1 FROM {target} done
+        JOIN professors pd ON pd.id = done.professor_id
+        WHERE pd.identity_key = {person}.identity_key
+        AND done.input_hash = {input_hash_sql}
+    )"""
+
+def delete_other_appointments_sql(table):
+    """Delete the person's rows in table filed under another department than
+    the one being saved. Parameters: name, department, name, department."""
+    return f"""
+    DELETE FROM {table}
+    WHERE professor_id IN (
+        SELECT id FROM professors WHERE identity_key =
+        (SELECT identity_key FROM professors WHERE id = {PROFESSOR_ID})
+    )
+    AND NOT (professor_name = ? AND department = ?)
+"""
+
+# Stage tables hold hashes into email_bodies, where each distinct email text
+# is stored once, compressed (see email_bodies); migrate_legacy moves the old
+# per-stage files' inline text into this layout
+STAGE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS email_bodies (
+        hash TEXT PRIMARY KEY,
+        body BLOB NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS templated_emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        professor_id INTEGER REFERENCES professors(id) ON DELETE CASCADE,
+        professor_name TEXT NOT NULL,
+        department TEXT NOT NULL,
+        email_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        UNIQUE(professor_name, department)
+    );
+    CREATE INDEX IF NOT EXISTS idx_templated_professor ON templated_emails(professor_id);
+
+    CREATE TABLE IF NOT EXISTS gemmed_emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        professor_id INTEGER REFERENCES professors(id) ON DELETE CASCADE,
+        professor_name TEXT NOT NULL,
+        department TEXT NOT NULL,
+        original_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        enhanced_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        paper_title TEXT NOT NULL,
+        verification_notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        input_hash TEXT,
+        UNIQUE(professor_name, department)
+    );
+    CREATE INDEX IF NOT EXISTS idx_gemmed_professor ON gemmed_emails(professor_id);
+
+    CREATE TABLE IF NOT EXISTS validated_emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        professor_id INTEGER REFERENCES professors(id) ON DELETE CASCADE,
+        professor_name TEXT NOT NULL,
+        department TEXT NOT NULL,
+        original_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        enhanced_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        validated_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        paper_title TEXT NOT NULL,
+        paper_verification TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        input_hash TEXT,
+        UNIQUE(professor_name, department)
+    );
+    CREATE INDEX IF NOT EXISTS idx_validated_professor ON validated_emails(professor_id);
+
+    -- Send history outlives the professor row it was linked to: the sender
+    -- matches it by name once professor_id is cleared
+    CREATE TABLE IF NOT EXISTS sent_emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        professor_id INTEGER REFERENCES professors(id) ON DELETE SET NULL,
+        professor_name TEXT NOT NULL,
+        professor_email TEXT NOT NULL,
+        email_hash TEXT NOT NULL REFERENCES email_bodies(hash),
+        sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        status TEXT,
+        UNIQUE(professor_name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sent_professor ON sent_emails(professor_id);
+"""
+
+# Read-side views with the email text filled in from email_bodies; a body
+# is only decompressed when its column is actually selected
+STAGE_VIEWS = """
+    CREATE VIEW IF NOT EXISTS templated_emails_text AS
+    SELECT t.*, decompress_body(b.body) AS email_content
+    FROM templated_emails t JOIN email_bodies b ON b.hash = t.email_hash;
+
+    CREATE VIEW IF NOT EXISTS gemmed_emails_text AS
+    SELECT g.*, decompress_body(bo.body) AS original_email,
+           decompress_body(be.body) AS enhanced_email
+    FROM gemmed_emails g
+    JOIN email_bodies bo ON bo.hash = g.original_hash
+    JOIN email_bodies be ON be.hash = g.enhanced_hash;
+
+    CREATE VIEW IF NOT EXISTS validated_emails_text AS
+    SELECT v.*, decompress_body(bo.body) AS original_email,
+           decompress_body(be.body) AS enhanced_email,
+           decompress_body(bv.body) AS validated_email
+    FROM validated_emails v
+    JOIN email_bodies bo ON bo.hash = v.original_hash
+    JOIN email_bodies be ON be.hash = v.enhanced_hash
+    JOIN email_bodies bv ON bv.hash = v.validated_hash;
+
+    CREATE VIEW IF NOT EXISTS sent_emails_text AS
+    SELECT s.*, decompress_body(b.body) AS email_content
+    FROM sent_emails s JOIN email_bodies b ON b.hash = s.email_hash;
+"""
+
+def ensure_schema(conn):
+    """Create the professors, citation and stage tables with their indexes,
+    views and full-text search indexes"""
+    # Imported here: the scraper modules import this one for the database path
+    from src.scrapers.faculty_scraper import ensure_professor_schema
+    from src.scrapers.citation_store import CitationStore
+    from src.utils.email_search import ensure_search_schema
+
+    ensure_professor_schema(conn)
+    CitationStore.setup_schema(conn)
+    conn.executescript(STAGE_SCHEMA)
+    conn.executescript(STAGE_VIEWS)
+    ensure_search_schema(conn)
+    conn.commit()
+
+def register_functions(conn):
+    """SQL versions of the Python keys and body helpers used in stage queries"""
+    conn.create_function('normalize_name', 1, normalize_name, deterministic=True)
+    conn.create_function('input_hash', 1, input_hash, deterministic=True)
+    conn.create_function('input_hash', 2, input_hash, deterministic=True)
+    conn.create_function('body_hash', 1, body_hash, deterministic=True)
+    conn.create_function('compress_body', 1, compress_body, deterministic=True)
+    conn.create_function('decompress_body', 1, decompress_body, deterministic=True)
+
+def connect(db_path=PIPELINE_DB_PATH, migrate=True, cached_statements=128):
+    """Open the consolidated pipeline database.
+
+    The database runs in WAL mode, so one stage can write while others read,
+    with foreign keys enforced. A database created next to the old
+    per-stage files is filled from them on first use.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    fresh = not db_path.exists()
+
+    conn = sqlite3.connect(db_path, timeout=30, cached_statements=cached_statements)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    register_functions(conn)
+    ensure_schema(conn)
+
+    if fresh and migrate and any((db_path.parent / f).exists() for f in LEGACY_DATABASES.values()):
+        migrate_legacy(conn, db_path.parent)
+    return conn
+
+def _legacy_tables(conn, alias):
+    return {row[0] for row in conn.execute(f"SELECT name FROM {alias}.sqlite_master WHERE type = 'table'")}
+
+def migrate_legacy(conn, legacy_dir=DB_DIR):
+    """Copy rows from the old per-stage database files into conn.
+
+    Professors keep their ids; stage rows get professor_id by joining on
+    (name, department), sent emails by identity key. Input hashes are
+    recomputed from the stored columns and email text goes into the body
+    store. Rows already present are left
+    alone, so running it again is harmless. Returns {table: rows copied}.
+    """
+    legacy_dir = Path(legacy_dir)
+    copied = {}
+
+    def run(table, sql):
+        # rowcount, unlike total_changes, leaves out the search index
+        # rows the sync triggers write
+        copied[table] = copied.get(table, 0) + conn.execute(sql).rowcount
+
+    def store_bodies(table, *columns):
+        texts = " UNION ".join(f"SELECT {column} AS text FROM {table}" for column in columns)
+        run('email_bodies', f"""
+            INSERT OR IGNORE INTO email_bodies (hash, body)
+            SELECT body_hash(text), compress_body(text) FROM ({texts})
+        """)
+
+    for alias, filename in LEGACY_DATABASES.items():
+        path = legacy_dir / filename
+        if not path.exists():
+            continue
+        alias = f"legacy_{alias}"
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (str(path),))
+        tables = _legacy_tables(conn, alias)
+
+        if alias == 'legacy_professors' and 'professors' in tables:
+            run('professors', """
+                INSERT OR IGNORE INTO professors (id, name, department, email, identity_key)
+                SELECT id, name, department, email, normalize_name(name) FROM legacy_professors.professors
+                ORDER BY id
+            """)
+            if 'professor_citations' in tables:
+                run('professor_citations', """
+                    INSERT OR IGNORE INTO professor_citations
+                    (identity_key, professor_name, department, paper_title, citation_count, year, updated_at)
+                    SELECT normalize_name(professor_name), professor_name, department, paper_title,
+                           citation_count, year, updated_at
+                    FROM legacy_professors.professor_citations ORDER BY id
+                """)
+
+        elif alias == 'legacy_templated' and 'templated_emails' in tables:
+            store_bodies('legacy_templated.templated_emails', 'email_content')
+            run('templated_emails', """
+                INSERT OR IGNORE INTO templated_emails
+                (professor_id, professor_name, department, email_hash)
+                SELECT p.id, t.professor_name, t.department, body_hash(t.email_content)
+                FROM legacy_templated.templated_emails t
+                LEFT JOIN professors p ON p.name = t.professor_name AND p.department = t.department
+                ORDER BY t.id
+            """)
+
+        elif alias == 'legacy_gemmed' and 'gemmed_emails' in tables:
+            store_bodies('legacy_gemmed.gemmed_emails', 'original_email', 'enhanced_email')
+            run('gemmed_emails', """
+                INSERT OR IGNORE INTO gemmed_emails
+                (professor_id, professor_name, department, original_hash, enhanced_hash,
+                 paper_title, verification_notes, created_at, input_hash)
+                SELECT p.id, g.professor_name, g.department, body_hash(g.original_email),
+                       body_hash(g.enhanced_email), g.paper_title, g.verification_notes,
+                       g.created_at, input_hash(body_hash(g.original_email))
+                FROM legacy_gemmed.gemmed_emails g
+                LEFT JOIN professors p ON p.name = g.professor_name AND p.department = g.department
+                ORDER BY g.id
+            """)
+
+        elif alias == 'legacy_validated' and 'validated_emails' in tables:
+            store_bodies('legacy_validated.validated_emails',
+                         'original_email', 'enhanced_email', 'validated_email')
+            run('validated_emails', """
+                INSERT OR IGNORE INTO validated_emails
+                (professor_id, professor_name, department, original_hash, enhanced_hash,
+                 validated_hash, paper_title, paper_verification, created_at, input_hash)
+                SELECT p.id, v.professor_name, v.department, body_hash(v.original_email),
+                       body_hash(v.enhanced_email), body_hash(v.validated_email), v.paper_title,
+                       v.paper_verification, v.created_at,
+                       input_hash(body_hash(v.original_email), body_hash(v.enhanced_email))
+                FROM legacy_validated.validated_emails v
+                LEFT JOIN professors p ON p.name = v.professor_name AND p.department = v.department
+                ORDER BY v.id
+            """)
+
+        elif alias == 'legacy_sent' and 'sent_emails' in tables:
+            store_bodies('legacy_sent.sent_emails', 'email_content')
+            run('sent_emails', """
+                INSERT OR IGNORE INTO sent_emails
+                (professor_id, professor_name, professor_email, email_hash, sent_date, status)
+                SELECT (SELECT MIN(p.id) FROM professors p
+                        WHERE p.identity_key = normalize_name(s.professor_name)),
+                       s.professor_name, s.professor_email, body_hash(s.email_content),
+                       s.sent_date, s.status
+                FROM legacy_sent.sent_emails s
+                ORDER BY s.id
+            """)
+
+        conn.commit()
+        conn.execute(f"DETACH DATABASE {alias}")
+
+    return copied
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidated pipeline database")
+    parser.add_argument('--migrate', action='store_true',
+                        help="copy rows from the old per-stage .db files (safe to repeat)")
+    parser.add_argument('--db', default=PIPELINE_DB_PATH, help="pipeline database path")
+    parser.add_argument('--legacy-dir', default=DB_DIR, help="directory with the old .db files")
+    parser.add_argument('--compact', action='store_true',
+                        help="drop email bodies nothing references any more and vacuum")
+    args = parser.parse_args()
+
+    # A new database next to the old files migrates itself on connect
+    conn = connect(args.db, migrate=not args.migrate)
+    if args.migrate:
+        for table, count in migrate_legacy(conn, args.legacy_dir).items():
+            print(f"{table}: {count} rows copied")
+    if args.compact:
+        print(f"Pruned {prune_bodies(conn)} unreferenced email bodies")
+        conn.execute("VACUUM")
+
+    for table in ('professors', 'professor_citations', 'templated_emails',
+                  'gemmed_emails', 'validated_emails', 'sent_emails', 'email_bodies'):
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"{table}: {count} rows")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
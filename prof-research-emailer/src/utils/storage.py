@@ -0,0 +1,137 @@
+import asyncio
+from contextlib import asynccontextmanager
+import threading
+import time
+from pathlib import Path
+
+from src.utils.pipeline_db import PIPELINE_DB_PATH, connect
+
+# Enough for every distinct statement the stages issue, so each is
+# prepared once per connection and reused from sqlite3's statement cache
+STATEMENT_CACHE_SIZE = 256
+
+# Rows pulled per fetchmany() when streaming a query
+FETCH_BATCH_SIZE = 64
+
+_local = threading.local()
+
+def get_connection(db_path=PIPELINE_DB_PATH):
+    """Long-lived pipeline connection for this thread.
+
+    Opened (and the schema checked) on first use, then shared by every
+    caller on the thread instead of connecting per row.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = str(Path(db_path).resolve())
+    if key not in connections:
+        connections[key] = connect(db_path, cached_statements=STATEMENT_CACHE_SIZE)
+    return connections[key]
+
+def close_connections():
+    """Close this thread's shared connections (committing pending work)"""
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.commit()
+        conn.close()
+    _local.connections = {}
+
+def iter_rows(conn, sql, params=(), batch_size=FETCH_BATCH_SIZE):
+    """Yield a query's rows, fetching batch_size at a time.
+
+    Only one batch is held in memory, and the first row is handed out as
+    soon as SQLite produces it rather than after the whole result. Writes
+    and commits on the same connection may happen while it is consumed.
+    """
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cursor.close()
+
+class BatchWriter:
+    """Groups writes on one connection into larger transactions.
+
+    Writes are committed once max_rows statements are pending or the oldest
+    pending one is max_seconds old, and on flush() / leaving the with
+    block, rather than one commit (and fsync) per row. Age is only checked
+    on a write or flush_if_due(); async stages open the writer with
+    batched_writes() so rows never wait long on a slow next write.
+    """
+
+    def __init__(self, conn, max_rows=100, max_seconds=2.0):
+        self.conn = conn
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.pending = 0
+        self.started = None
+
+    def execute(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        self._written(1)
+        return cursor
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        cursor = self.conn.executemany(sql, rows)
+        self._written(len(rows))
+        return cursor
+
+    def _written(self, count):
+        if self.started is None:
+            self.started = time.monotonic()
+        self.pending += count
+        if self.pending >= self.max_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Commit if the oldest pending write is max_seconds old"""
+        if self.started is not None and time.monotonic() - self.started >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.commit()
+        self.pending = 0
+        self.started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Rows written before an error are kept; the failed statement
+        # itself was never applied
+        self.flush()
+
+async def flush_periodically(writer, interval=None):
+    """Keep committing writer's due rows while an async stage runs.
+
+    Run it as a task next to the stage and cancel it when the stage ends;
+    it checks every max_seconds / 2 by default.
+    """
+    while True:
+        await asyncio.sleep(interval or writer.max_seconds / 2)
+        writer.flush_if_due()
+
+@asynccontextmanager
+async def batched_writes(conn, **limits):
+    """BatchWriter on conn for an async stage, yielded with a
+    flush_periodically task running.
+
+    Saved rows are committed on time even while the stage's remaining calls
+    are still waiting, and whatever is pending is committed on exit.
+    limits are passed to BatchWriter.
+    """
+    writer = BatchWriter(conn, **limits)
+    flusher = asyncio.ensure_future(flush_periodically(writer))
+    try:
+        yield writer
+    finally:
+        flusher.cancel()
+        writer.flush()
@@ -0,0 +1,27 @@
+import json
+
+def build_student_prefix(student_info: dict, rules: str = "") -> str:
+    """Static head shared by every prompt of a stage.
+
+    Holds the student's background (and optionally the stage's fixed
+    rules); it is identical for every professor, so it is sent once as
+    cached context and each request only carries the per-professor part.
+    """
+    prefix = f"""
+        You help a student write research opportunity emails to University of Toronto professors.
+
+        Student's EXACT Background (mention nothing that is not listed here):
+        - Name: {student_info['name']}
+        - Program: {student_info['program']}
+        - Year: {student_info['year']}
+        - Actual Courses (only these): {', '.join(student_info['relevant_courses'])}
+        - Verified Technical Skills (only these): {', '.join(student_info['technical_skills'])}
+        - Research interests: {', '.join(student_info['research_interests'])}
+        - Real Projects:
+        {json.dumps(student_info['projects'], indent=2)}
+        - Actual Awards:
+        {json.dumps(student_info['awards'], indent=2)}
+        """
+    if rules:
+        prefix += rules
+    return prefix
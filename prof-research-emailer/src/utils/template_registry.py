@@ -0,0 +1,71 @@
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = Path(__file__).parent.parent / 'templates'
+BYTECODE_CACHE_DIR = Path(__file__).parent.parent / 'databases' / 'jinja_cache'
+DEFAULT_TEMPLATE = 'email_template.j2'
+
+# Variables the templates leave for the model to fill, with what each one
+# should contain; left unset, a slot renders as its <Insert ...> placeholder
+TEMPLATE_SLOTS = {
+    'their_research_interests': "the professor's research interests, completing "
+                                "\"I am deeply interested in ...\" and ending with a period",
+    'relevant_courses': "the student's courses relevant to this professor, completing "
+                        "\"including ...\"",
+    'relevant_projects': "the student's projects relevant to this professor, completing "
+                         "\"projects such as ...\"",
+    'your_research_interests': "the student's research interests that overlap with the "
+                               "professor's, completing \"I am particularly interested in ...\"",
+}
+
+class TemplateRegistry:
+    """Compiled email templates, chosen per department and/or student.
+
+    Each template is parsed and compiled once per process; the compiled
+    bytecode is also kept on disk so a fresh process skips compilation.
+    Templates are not reloaded when the file changes during a run.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, cache_dir=BYTECODE_CACHE_DIR,
+                 default=DEFAULT_TEMPLATE):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.env = Environment(
+            loader=FileSystemLoader(str(template_dir)),
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+            auto_reload=False,
+        )
+        self.default = default
+        # (department, student) -> template name; None matches anything
+        self.rules = {}
+        self._compiled = {}
+
+    def register(self, template_name, department=None, student=None):
+        """Use template_name for a department, a student, or both together"""
+        self.rules[(department, student)] = template_name
+
+    def select(self, department=None, student=None) -> str:
+        """Most specific registered template: department and student, then
+        department, then student, then the default"""
+        for key in ((department, student), (department, None), (None, student)):
+            if key in self.rules:
+                return self.rules[key]
+        return self.default
+
+    def get(self, department=None, student=None):
+        name = self.select(department, student)
+        if name not in self._compiled:
+            self._compiled[name] = self.env.get_template(name)
+        return self._compiled[name]
+
+    def render(self, department=None, student=None, **context) -> str:
+        return self.get(department, student).render(**context)
+
+_registry = None
+
+def get_template_registry() -> TemplateRegistry:
+    """Process-wide registry shared by every email generated in this run"""
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry()
+    return _registry
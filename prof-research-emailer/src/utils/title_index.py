@@ -0,0 +1,67 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+def normalize_title(title: str) -> str:
+    """Lowercase, strip accents and punctuation, drop a trailing ellipsis"""
+    title = unicodedata.normalize('NFKD', title or '')
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = title.casefold().replace('…', ' ').replace('...', ' ')
+    return ' '.join(re.sub(r'[^\w]+', ' ', title).split())
+
+def trigrams(text: str) -> Counter:
+    padded = f'  {text} '
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class TitleIndex:
+    """Character-trigram index over one author's publication titles.
+
+    best_match scores every candidate in a single pass over the query's
+    trigram postings. The score is the Dice overlap of the two trigram sets,
+    or, when one title is a truncation of the other (LLM output or Scholar's
+    "…"), how much of the shorter one is contained in the longer.
+    """
+
+    # Containment only counts for a reasonably long prefix of the other title;
+    # short fragments ("cardiac tissue") would otherwise match too easily
+    MIN_CONTAINMENT_GRAMS = 25
+    MIN_CONTAINMENT_RATIO = 0.4
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.normalized = [normalize_title(t) for t in self.titles]
+        self.sizes = []
+        self.postings = defaultdict(list)
+        for i, norm in enumerate(self.normalized):
+            grams = trigrams(norm)
+            self.sizes.append(sum(grams.values()))
+            for gram, count in grams.items():
+                self.postings[gram].append((i, count))
+
+    def best_match(self, query: str):
+        """Return (index, title, confidence in [0, 1]) or None if nothing overlaps"""
+        norm = normalize_title(query)
+        if not norm:
+            return None
+
+        grams = trigrams(norm)
+        query_size = sum(grams.values())
+        overlap = Counter()
+        for gram, count in grams.items():
+            for i, title_count in self.postings.get(gram, ()):
+                overlap[i] += min(count, title_count)
+
+        best = None
+        for i, shared in overlap.items():
+            if self.normalized[i] == norm:
+                return i, self.titles[i], 1.0
+
+            score = 2 * shared / (query_size + self.sizes[i])
+            shorter, longer = sorted((query_size, self.sizes[i]))
+            if (shorter >= self.MIN_CONTAINMENT_GRAMS
+                    and shorter >= self.MIN_CONTAINMENT_RATIO * longer):
+                score = max(score, 0.95 * shared / shorter)
+
+            if best is None or score > best[2]:
+                best = (i, self.titles[i], score)
+        return best
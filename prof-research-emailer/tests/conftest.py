@@ -0,0 +1,59 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Tests import the project as `src.…`, like the scripts run from the project root
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+class ListingServer:
+    """Local stand-in for a department site: serves one page with an ETag
+    and Last-Modified, and answers 304 to a request whose validators match.
+    Change body/etag/last_modified to publish a new version."""
+
+    def __init__(self):
+        self.body = b"<ul><li>Aaron Wheeler</li><li>Goldie Nejat</li></ul>"
+        self.etag = '"v1"'
+        self.last_modified = 'Sat, 17 Oct 2026 00:00:00 GMT'
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                if server.is_fresh(self.headers):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if server.etag:
+                    self.send_header('ETag', server.etag)
+                self.send_header('Last-Modified', server.last_modified)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/faculty/"
+
+    def is_fresh(self, headers):
+        if 'If-None-Match' in headers:
+            return self.etag is not None and headers['If-None-Match'] == self.etag
+        return headers.get('If-Modified-Since') == self.last_modified
+
+@pytest.fixture
+def listing_server(monkeypatch):
+    # Reach the local server directly even if the environment sets a proxy
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    server = ListingServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
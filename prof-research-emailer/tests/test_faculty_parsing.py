@@ -0,0 +1,26 @@
+from pathlib import Path
+
+import pytest
+
+from src.scrapers.faculty_scraper import DEPARTMENT_CONFIGS, parse_listing
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures' / 'listings'
+
+EXPECTED = {
+    "MIE": ["Goldie Nejat", "Cristina Amon", "Jean Zu"],
+    "Chemical": ["Edward Sargent", "Molly Shoichet"],
+    "MSE": ["Uwe Erb", "Jane Howe", "Yu Zou"],
+    "BME": ["Aaron Wheeler", "Warren Chan"],
+}
+
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+@pytest.mark.parametrize('dept', sorted(DEPARTMENT_CONFIGS))
+def test_targeted_parse_matches_full_parse(dept, parser):
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    html = (FIXTURE_DIR / f'{dept}.html').read_text(encoding='utf-8')
+    config = DEPARTMENT_CONFIGS[dept]
+
+    full = parse_listing(html, config, fast=False)
+    assert full == EXPECTED[dept]
+    assert parse_listing(html, config, fast=True, parser=parser) == full
@@ -0,0 +1,43 @@
+from bs4 import SoupStrainer
+
+from src.scrapers import faculty_scraper
+from src.utils.pipeline_db import connect
+
+def listing_config(url):
+    return {
+        "TEST": {
+            "url": url,
+            "parse_only": SoupStrainer('li'),
+            "selector": lambda soup: [li.get_text(strip=True) for li in soup.find_all('li')]
+        }
+    }
+
+def scrape(server, db_path, cache_path):
+    return faculty_scraper.scrape_professors(
+        listing_config(server.url), host_delay=0, db_path=db_path, cache_path=str(cache_path)
+    )
+
+def professor_count(db_path):
+    conn = connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM professors").fetchone()[0]
+    conn.close()
+    return count
+
+def test_warm_http_cache_still_fills_a_new_database(listing_server, tmp_path):
+    cache_path = tmp_path / 'http_cache.db'
+
+    first = tmp_path / 'first.db'
+    assert 'TEST' in scrape(listing_server, first, cache_path)
+    assert professor_count(first) == 2
+
+    # Same database again: the request is conditional, the 304 is trusted
+    # and nothing is rewritten
+    assert scrape(listing_server, first, cache_path) == {}
+    assert listing_server.requests[-1]['If-None-Match'] == '"v1"'
+
+    # A new database with the same warm cache must still get the professors,
+    # so its request is unconditional
+    second = tmp_path / 'second.db'
+    assert 'TEST' in scrape(listing_server, second, cache_path)
+    assert 'If-None-Match' not in listing_server.requests[-1]
+    assert professor_count(second) == 2
@@ -0,0 +1,16 @@
+from google.genai import errors
+
+from src.utils.gemini_client import is_rate_limited
+from src.utils.llm_backends import FakeRateLimitError, FakeServerError
+
+def api_error(code, status, message):
+    return errors.ClientError(code, {'error': {'code': code, 'status': status, 'message': message}})
+
+def test_rate_limits_are_recognised_by_status_code():
+    assert is_rate_limited(api_error(429, 'RESOURCE_EXHAUSTED', "Quota exceeded"))
+    assert is_rate_limited(FakeRateLimitError())
+
+def test_429_in_the_message_is_not_a_rate_limit():
+    assert not is_rate_limited(api_error(400, 'INVALID_ARGUMENT', "Request 4290a1 is invalid"))
+    assert not is_rate_limited(ValueError("Retrieved 429 papers"))
+    assert not is_rate_limited(FakeServerError())
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from src.utils.email_bodies import get_body
+from src.utils.email_enhancer import EmailEnhancer
+from src.utils.email_generator import render_many
+from src.utils.email_validator import EmailValidator
+from src.utils.input_hash import input_hash
+from src.utils.gemini_client import AsyncGeminiClient
+from src.utils.llm_backends import (FakeBackend, LLMBackend, MissingRecordingError, ReplayBackend,
+                                     canned_response, uniform_latency)
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.storage import BatchWriter, close_connections, get_connection
+
+PROFESSORS = [
+    ("Aaron Wheeler", "BME", "Digital microfluidics"),
+    ("Goldie Nejat", "MIE", "Socially assistive robots"),
+]
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'pipeline.db'
+    conn = get_connection(path)
+    conn.executemany(
+        "INSERT INTO professors (name, department, identity_key) VALUES (?, ?, normalize_name(?))",
+        [(name, department, name) for name, department, _ in PROFESSORS]
+    )
+    with BatchWriter(conn) as writer:
+        render_many(PROFESSORS, writer=writer)
+    yield path
+    close_connections()
+
+def fake_backend():
+    return FakeBackend(latency=uniform_latency(0.0, 0.01))
+
+def test_incomplete_backend_fails_on_creation():
+    class NoGenerate(LLMBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        NoGenerate()
+
+def test_replay_miss_is_not_retried(tmp_path):
+    recording = tmp_path / 'recording.jsonl'
+    recording.write_text('')
+    client = AsyncGeminiClient(ReplayBackend(recording))
+
+    start = time.perf_counter()
+    with pytest.raises(MissingRecordingError):
+        asyncio.run(client.generate("Never recorded"))
+    assert time.perf_counter() - start < 1
+
+def test_enhancer_saves_gemmed_emails(db_path):
+    backend = fake_backend()
+    results = EmailEnhancer(use_cache=False, backend=backend, db_path=db_path).process_all_emails()
+
+    assert sorted(results) == [("Aaron Wheeler", True), ("Goldie Nejat", True)]
+    conn = get_connection(db_path)
+    rows = conn.execute("""
+        SELECT t.email_hash, g.original_hash, g.enhanced_hash, g.input_hash, g.professor_id
+        FROM gemmed_emails g JOIN templated_emails t USING (professor_name, department)
+    """).fetchall()
+    assert len(rows) == 2
+    for templated_hash, original_hash, enhanced_hash, row_hash, professor_id in rows:
+        assert original_hash == templated_hash
+        assert row_hash == input_hash(templated_hash)
+        assert professor_id is not None
+        assert get_body(conn, enhanced_hash).startswith("Dear Professor")
+
+    # Nothing changed upstream, so a second run makes no calls
+    calls = backend.stats['calls']
+    assert EmailEnhancer(use_cache=False, backend=backend, db_path=db_path).process_all_emails() == []
+    assert backend.stats['calls'] == calls
+
+def test_validator_saves_validated_emails(db_path, monkeypatch):
+    EmailEnhancer(use_cache=False, backend=fake_backend(), db_path=db_path).process_all_emails()
+
+    titles = dict((name, title) for name, _, title in PROFESSORS)
+    monkeypatch.setattr(EmailValidator, 'verify_publication', lambda self, name, title: {
+        "verified": True, "paper": titles[name], "year": 2020
+    })
+    backend = fake_backend()
+    EmailValidator(use_cache=False, backend=backend, db_path=db_path).process_enhanced_emails()
+
+    conn = get_connection(db_path)
+    rows = conn.execute("""
+        SELECT professor_name, paper_title, validated_email FROM validated_emails_text
+    """).fetchall()
+    assert sorted((name, title) for name, title, _ in rows) == sorted(titles.items())
+    for name, title, email in rows:
+        assert f'"{title}"' in email
+    assert backend.stats['calls'] == 2
+
+def test_fill_slots_forgets_malformed_replies(db_path, tmp_path):
+    def missing_slot(prompt, response_schema):
+        reply = json.loads(canned_response(prompt, response_schema))
+        reply['relevant_courses'] = None
+        return json.dumps(reply)
+
+    backend = FakeBackend(latency=uniform_latency(0.0, 0.01), responder=missing_slot)
+    enhancer = EmailEnhancer(use_cache=False, backend=backend, db_path=db_path, fill_slots=True)
+    enhancer.llm.cache = LLMResponseCache(tmp_path / 'llm_cache.db')
+
+    assert sorted(enhancer.process_all_emails()) == [("Aaron Wheeler", False), ("Goldie Nejat", False)]
+    assert enhancer.llm.cache.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] == 0
+
+def test_fill_slots_renders_template_locally(db_path):
+    EmailEnhancer(use_cache=False, backend=fake_backend(), db_path=db_path,
+                  fill_slots=True).process_all_emails()
+
+    conn = get_connection(db_path)
+    for (email,) in conn.execute("SELECT enhanced_email FROM gemmed_emails_text"):
+        assert "<Insert" not in email
+        assert "fake relevant_courses" in email
+        assert email.endswith("Warm regards,\nKevin Peng")
+
+@pytest.mark.parametrize('reply', [
+    {"verified": True, "publication": "Digital microfluidics", "notes": "ok", "email": "  "},
+    {"verified": True, "publication": "Digital microfluidics", "notes": "ok"},
+    {"publication": "Digital microfluidics", "notes": "ok", "email": "Dear Professor"},
+    {"verified": "yes", "publication": "Digital microfluidics", "email": "Dear Professor"},
+])
+def test_single_call_forgets_malformed_replies(db_path, tmp_path, reply):
+    backend = FakeBackend(latency=uniform_latency(0.0, 0.01),
+                          responder=lambda prompt, response_schema: json.dumps(reply))
+    enhancer = EmailEnhancer(use_cache=False, backend=backend, db_path=db_path, single_call=True)
+    enhancer.llm.cache = LLMResponseCache(tmp_path / 'llm_cache.db')
+
+    assert sorted(enhancer.process_all_emails()) == [("Aaron Wheeler", False), ("Goldie Nejat", False)]
+    assert enhancer.llm.cache.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] == 0
+    conn = get_connection(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM gemmed_emails").fetchone()[0] == 0
+
+def test_single_call_saves_verified_email(db_path):
+    EmailEnhancer(use_cache=False, backend=fake_backend(), db_path=db_path,
+                  single_call=True).process_all_emails()
+
+    conn = get_connection(db_path)
+    emails = [email for (email,) in conn.execute("SELECT enhanced_email FROM gemmed_emails_text")]
+    assert len(emails) == 2
+    assert all(email.startswith("Dear Professor") for email in emails)
@@ -0,0 +1,42 @@
+from src.utils.llm_cache import TOUCH_BATCH_SIZE, LLMResponseCache
+
+class CountingConnection:
+    """Wraps a sqlite3 connection, counting commits"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+        self.conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+def test_hits_do_not_commit_one_by_one(tmp_path):
+    cache = LLMResponseCache(tmp_path / 'llm_cache.db')
+    cache.put('key', 'model', 'reply')
+    cache.conn = CountingConnection(cache.conn)
+
+    for _ in range(TOUCH_BATCH_SIZE - 1):
+        assert cache.get('key') == 'reply'
+    assert cache.conn.commits == 0
+
+    cache.flush()
+    assert cache.conn.commits == 1
+    used, created = cache.conn.execute(
+        "SELECT last_used, created_at FROM llm_responses WHERE key = 'key'"
+    ).fetchone()
+    assert used > created
+
+def test_eviction_sees_buffered_hits(tmp_path):
+    cache = LLMResponseCache(tmp_path / 'llm_cache.db', max_entries=2)
+    cache.put('old', 'model', 'kept')
+    cache.put('newer', 'model', 'evicted')
+    # Only buffered, but it makes 'old' the most recently used
+    cache.get('old')
+    cache.put('newest', 'model', 'reply')
+
+    assert cache.get('old') == 'kept'
+    assert cache.get('newer') is None
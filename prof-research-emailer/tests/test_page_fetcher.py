@@ -0,0 +1,56 @@
+from src.scrapers.http_cache import HTTPCache
+from src.scrapers.page_fetcher import PageFetcher
+
+def test_fetch_many_returns_non_requests_errors(monkeypatch):
+    def fetch(self, url, headers=None):
+        if 'bad' in url:
+            raise UnicodeError("label too long")
+        return url
+
+    monkeypatch.setattr(PageFetcher, 'fetch', fetch)
+    with PageFetcher(host_delay=0) as fetcher:
+        results = {key: (response, error) for key, response, error in fetcher.fetch_many({
+            'good': 'https://faculty.example/ok', 'bad': 'https://bad.example/'
+        })}
+
+    assert results['good'] == ('https://faculty.example/ok', None)
+    assert results['bad'][0] is None
+    assert isinstance(results['bad'][1], UnicodeError)
+
+def test_conditional_get_against_a_server(listing_server, tmp_path):
+    cache = HTTPCache(tmp_path / 'http_cache.db')
+    url = listing_server.url
+
+    with PageFetcher(host_delay=0) as fetcher:
+        first = fetcher.fetch(url, cache.conditional_headers(url))
+        assert first.status_code == 200
+        assert not cache.is_unchanged(url, first)
+        cache.store(url, first)
+
+        headers = cache.conditional_headers(url)
+        assert headers == {'If-None-Match': '"v1"', 'If-Modified-Since': listing_server.last_modified}
+        again = fetcher.fetch(url, headers)
+        assert again.status_code == 304
+        assert cache.is_unchanged(url, again)
+        cache.store(url, again)
+
+        # A new version is fetched in full and counts as changed
+        listing_server.etag = '"v2"'
+        listing_server.body += b"<li>Warren Chan</li>"
+        changed = fetcher.fetch(url, cache.conditional_headers(url))
+        assert changed.status_code == 200
+        assert not cache.is_unchanged(url, changed)
+        cache.store(url, changed)
+        assert cache.conditional_headers(url)['If-None-Match'] == '"v2"'
+    cache.close()
+
+def test_last_modified_alone_revalidates(listing_server, tmp_path):
+    listing_server.etag = None
+    cache = HTTPCache(tmp_path / 'http_cache.db')
+    url = listing_server.url
+
+    with PageFetcher(host_delay=0) as fetcher:
+        cache.store(url, fetcher.fetch(url))
+        assert cache.conditional_headers(url) == {'If-Modified-Since': listing_server.last_modified}
+        assert fetcher.fetch(url, cache.conditional_headers(url)).status_code == 304
+    cache.close()
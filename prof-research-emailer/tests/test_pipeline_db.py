@@ -0,0 +1,80 @@
+import sqlite3
+
+from src.utils.email_bodies import body_hash, put_bodies
+from src.utils.pipeline_db import PROFESSOR_ID, connect, first_appointment_sql, not_processed_sql
+
+def add_sent_email(conn, name):
+    conn.execute(
+        "INSERT INTO professors (name, department, identity_key) VALUES (?, 'BME', normalize_name(?))",
+        (name, name)
+    )
+    email_hash, = put_bodies(conn, f"Dear Professor {name},")
+    conn.execute("""
+        INSERT INTO sent_emails (professor_id, professor_name, professor_email, email_hash, status)
+        SELECT id, name, 'prof@example.com', ?, 'sent' FROM professors WHERE name = ?
+    """, (email_hash, name))
+    conn.commit()
+
+def test_deleting_a_professor_keeps_send_history(tmp_path):
+    conn = connect(tmp_path / 'pipeline.db')
+    add_sent_email(conn, "Aaron Wheeler")
+    conn.execute("DELETE FROM professors")
+    conn.commit()
+
+    rows = conn.execute("SELECT professor_id, professor_name FROM sent_emails").fetchall()
+    assert rows == [(None, "Aaron Wheeler")]
+    conn.close()
+
+def test_legacy_databases_migrate_into_the_body_store(tmp_path):
+    legacy = sqlite3.connect(tmp_path / 'uoft_professors.db')
+    legacy.execute("CREATE TABLE professors (id INTEGER PRIMARY KEY, name, department, email)")
+    legacy.execute("INSERT INTO professors VALUES (7, 'Aaron Wheeler', 'BME', NULL)")
+    legacy.commit()
+    legacy.close()
+    legacy = sqlite3.connect(tmp_path / 'templated_emails.db')
+    legacy.execute("""CREATE TABLE templated_emails
+                      (id INTEGER PRIMARY KEY, professor_name, department, email_content)""")
+    legacy.execute("INSERT INTO templated_emails VALUES (1, 'Aaron Wheeler', 'BME', 'Dear Professor')")
+    legacy.commit()
+    legacy.close()
+
+    conn = connect(tmp_path / 'pipeline.db')
+    assert conn.execute("SELECT professor_id, email_hash FROM templated_emails").fetchall() == [
+        (7, body_hash("Dear Professor"))
+    ]
+    assert conn.execute("SELECT email_content FROM templated_emails_text").fetchall() == [
+        ("Dear Professor",)
+    ]
+    conn.close()
+
+def test_cross_appointed_professor_is_processed_once(tmp_path):
+    conn = connect(tmp_path / 'pipeline.db')
+    conn.executemany(
+        "INSERT INTO professors (name, department, identity_key) VALUES (?, ?, normalize_name(?))",
+        [("Aaron Wheeler", "BME", "Aaron Wheeler"), ("Aaron Wheeler", "Chemical", "Aaron Wheeler"),
+         ("Goldie Nejat", "MIE", "Goldie Nejat")]
+    )
+    email_hash, = put_bodies(conn, "Dear Professor")
+    conn.executemany(f"""
+        INSERT INTO templated_emails (professor_id, professor_name, department, email_hash)
+        VALUES ({PROFESSOR_ID}, ?, ?, ?)
+    """, [(name, dept, name, dept, email_hash) for name, dept in
+          [("Aaron Wheeler", "Chemical"), ("Aaron Wheeler", "BME"), ("Goldie Nejat", "MIE")]])
+
+    todo = f"""
+        SELECT t.professor_name, t.department FROM templated_emails t
+        JOIN professors p ON p.id = t.professor_id
+        WHERE {first_appointment_sql('templated_emails', 't')}
+        AND {not_processed_sql('gemmed_emails', 'input_hash(t.email_hash)')}
+        ORDER BY t.id
+    """
+    assert conn.execute(todo).fetchall() == [("Aaron Wheeler", "Chemical"), ("Goldie Nejat", "MIE")]
+
+    # Enhanced under one department, the person is done for all of them
+    conn.execute(f"""
+        INSERT INTO gemmed_emails (professor_id, professor_name, department, original_hash,
+                                   enhanced_hash, paper_title, input_hash)
+        VALUES ({PROFESSOR_ID}, 'Aaron Wheeler', 'BME', ?, ?, 'Digital microfluidics', input_hash(?))
+    """, ("Aaron Wheeler", "BME", email_hash, email_hash, email_hash))
+    assert conn.execute(todo).fetchall() == [("Goldie Nejat", "MIE")]
+    conn.close()
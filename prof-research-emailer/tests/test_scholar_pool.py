@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from src.scrapers import scholar_cache
+from src.scrapers.scholar_cache import ScholarCache
+from src.scrapers.scholar_pool import lookup_publications
+
+NAMES = ["Aaron Wheeler", "Goldie Nejat", "Warren Chan", "Molly Shoichet", "Yu Zou", "Jane Howe"]
+
+class FakeScholar:
+    """Stands in for the scholarly module: canned profiles, a little latency,
+    and a "Cannot Fetch" block for requests through a blocked proxy"""
+
+    def __init__(self, latency=0.01, blocked=()):
+        self.latency = latency
+        self.blocked = set(blocked)
+        self.proxy = None
+        self.proxies_used = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def use_proxy(self, proxy):
+        self.proxy = proxy
+        self.proxies_used.append(proxy)
+
+    def _request(self):
+        with self._lock:
+            self.calls.append(time.monotonic())
+        time.sleep(self.latency)
+        if self.proxy in self.blocked:
+            raise Exception("Cannot Fetch from Google Scholar.")
+
+    def search_author(self, name):
+        self._request()
+        return iter([{'name': name, 'scholar_id': f'id-{name}', 'affiliation': 'UofT', 'interests': []}])
+
+    def fill(self, author, sections=None, publication_limit=0):
+        self._request()
+        return dict(author, publications=[
+            {'bib': {'title': f"Paper by {author['name']}", 'pub_year': '2020'}, 'num_citations': 3}
+        ])
+
+@pytest.fixture(autouse=True)
+def profile_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(scholar_cache, '_cache', ScholarCache(tmp_path / 'scholar_cache.db'))
+
+def titles(results):
+    return [(name, [pub['title'] for pub in pubs]) for name, pubs in results]
+
+def test_pool_keeps_to_the_rate_limit():
+    fake = FakeScholar()
+    rate, burst = 20, 1
+    results = list(lookup_publications(NAMES, max_workers=3, rate=rate, burst=burst, backend=fake))
+
+    assert titles(results) == [(name, [f"Paper by {name}"]) for name in NAMES]
+    calls = sorted(fake.calls)
+    assert len(calls) == 2 * len(NAMES)
+    # However many workers run, the n-th request waits for its token
+    for n, at in enumerate(calls):
+        assert at - calls[0] >= (n - burst) / rate - 0.01
+
+def test_blocked_proxy_is_rotated_out():
+    fake = FakeScholar(blocked={'proxy-a'})
+    start = time.monotonic()
+    results = list(lookup_publications(NAMES, max_workers=3, rate=100, burst=3, backoff=60,
+                                       backend=fake, proxies=['proxy-a', 'proxy-b', 'proxy-c']))
+
+    assert titles(results) == [(name, [f"Paper by {name}"]) for name in NAMES]
+    assert fake.proxies_used == ['proxy-a', 'proxy-b']
+    # Switching proxies retried at once instead of pausing for the backoff
+    assert time.monotonic() - start < 5
+
+def test_throttling_without_spare_proxies_pauses_and_retries():
+    fake = FakeScholar(blocked={'proxy-a'})
+    unblock = threading.Timer(0.2, fake.blocked.clear)
+    unblock.start()
+    results = list(lookup_publications(NAMES[:2], max_workers=2, rate=100, burst=2, backoff=0.1,
+                                       backend=fake, proxies=['proxy-a']))
+    unblock.join()
+
+    assert titles(results) == [(name, [f"Paper by {name}"]) for name in NAMES[:2]]
+    assert fake.proxies_used == ['proxy-a']
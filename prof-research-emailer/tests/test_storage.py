@@ -0,0 +1,24 @@
+import asyncio
+import sqlite3
+
+from src.utils.storage import batched_writes
+
+def test_pending_rows_commit_without_another_write(tmp_path):
+    path = tmp_path / 'batch.db'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE rows (x)")
+    conn.commit()
+    committed = []
+
+    async def stage():
+        async with batched_writes(conn, max_seconds=0.05) as writer:
+            writer.execute("INSERT INTO rows VALUES (1)")
+            # A slow LLM call: no further write arrives for a while
+            await asyncio.sleep(0.2)
+            committed.append(sqlite3.connect(path).execute("SELECT COUNT(*) FROM rows").fetchone()[0])
+            writer.execute("INSERT INTO rows VALUES (2)")
+
+    asyncio.run(stage())
+    assert committed == [1]
+    # Leaving the block commits the rest
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM rows").fetchone()[0] == 2